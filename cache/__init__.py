@@ -0,0 +1,7 @@
+import cache.catalog
+import cache.search
+import cache.pubsub
+import cache.level
+import cache.user_name
+import cache.client
+import cache.session
\ No newline at end of file
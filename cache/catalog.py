@@ -0,0 +1,70 @@
+from loguru import logger
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+'''
+catalog:version -> catalog version, bumped when levels are uploaded, deleted or (un)featured
+count:{version}:{signature} -> level count of a filtered listing
+A Redis error is logged and treated as a cache miss, requests fall through to the database.
+'''
+
+COUNT_CACHE_EXPIRE: int = 60 * 5  # 5 minutes, bounds the staleness of stats-based filters
+
+
+def filter_signature(**filters) -> str:
+    # normalized signature of listing filters, unset filters are left out
+    return '&'.join(
+        f'{key}={value}' for key, value in sorted(filters.items()) if value is not None
+    )
+
+
+async def get_catalog_version(
+        redis: Redis
+) -> int | None:
+    # None when Redis is unavailable, nothing is cached then
+    try:
+        version = await redis.get("catalog:version")
+    except RedisError as e:
+        logger.warning(f"Failed to get catalog version: {e}")
+        return None
+    return int(version) if version is not None else 0
+
+
+async def bump_catalog_version(
+        redis: Redis
+) -> int | None:
+    # without Redis, cached pages and counts are stale until they expire
+    try:
+        return await redis.incr("catalog:version")
+    except RedisError as e:
+        logger.error(f"Failed to bump catalog version: {e}")
+        return None
+
+
+async def get_cached_level_count(
+        redis: Redis,
+        version: int,
+        signature: str
+) -> int | None:
+    try:
+        count = await redis.get(f"count:{version}:{signature}")
+    except RedisError as e:
+        logger.warning(f"Failed to get cached level count: {e}")
+        return None
+    return int(count) if count is not None else None
+
+
+async def set_cached_level_count(
+        redis: Redis,
+        version: int,
+        signature: str,
+        count: int
+):
+    try:
+        await redis.set(
+            f"count:{version}:{signature}",
+            count,
+            ex=COUNT_CACHE_EXPIRE
+        )
+    except RedisError as e:
+        logger.warning(f"Failed to cache level count: {e}")
@@ -0,0 +1,55 @@
+from redis.asyncio import Redis
+
+from cache.pubsub import publish_invalidation
+
+'''
+client_cache:invalidate -> pub/sub channel of client tokens created, revoked or deleted
+'''
+
+CLIENT_CACHE_CHANNEL: str = "client_cache:invalidate"
+
+
+class ClientCache:
+    # the whole client table by token in this worker, it is tiny and only changed through /client
+    # entries are transient copies, detached from the session they were read in
+    def __init__(self):
+        self.clients: dict[str, object] = {}
+        self.stale_tokens: set[str] = set()
+        self.loaded: bool = False
+
+    async def load(self, dal):
+        self.stale_tokens.clear()
+        self.clients = {client.token: copy_client(client) for client in await dal.get_all_clients()}
+        self.loaded = True
+
+    async def get(self, dal, token: str):
+        # only reaches the database after the client changed in another worker
+        if not self.loaded:
+            await self.load(dal)
+        elif token in self.stale_tokens:
+            self.stale_tokens.discard(token)
+            self.update(token, await dal.get_client_by_token(token=token))
+        return self.clients.get(token)
+
+    def update(self, token: str, client):
+        if client is None:
+            self.clients.pop(token, None)
+        else:
+            self.clients[token] = copy_client(client)
+
+    async def changed(self, redis: Redis, token: str, client):
+        # called after a client is created, revoked or deleted (client is None) and committed
+        self.update(token, client)
+        await publish_invalidation(redis, CLIENT_CACHE_CHANNEL, [token])
+
+    def invalidate(self, tokens):
+        self.stale_tokens.update(tokens)
+
+    def clear(self):
+        self.loaded = False
+
+
+def copy_client(client):
+    return type(client)(**{
+        attribute.key: getattr(client, attribute.key) for attribute in client.__mapper__.column_attrs
+    })
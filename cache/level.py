@@ -0,0 +1,69 @@
+import time
+from collections import OrderedDict
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+from config import DATABASE_LEVEL_CACHE_SIZE, DATABASE_LEVEL_CACHE_TTL
+
+'''
+level_cache:invalidate -> pub/sub channel of level ids whose cached metadata is stale
+Published by DBAccessLayer.commit() after any write to a level row.
+'''
+
+LEVEL_CACHE_CHANNEL: str = "level_cache:invalidate"
+
+
+class LevelCache:
+    # bounded LRU cache of level metadata by level id, shared by all DALs of this worker
+    # entries are detached copies, DALs merge them into their own session
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries: OrderedDict[str, tuple[float, object]] = OrderedDict()
+        # bumped on every invalidation, so rows read before it are not cached afterwards
+        self.version: int = 0
+        self.stats: dict[str, int] = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+        }
+
+    def get(self, level_id: str):
+        entry = self.entries.get(level_id)
+        if entry is not None and entry[0] < time.monotonic():
+            del self.entries[level_id]
+            entry = None
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        self.entries.move_to_end(level_id)
+        self.stats["hits"] += 1
+        return entry[1]
+
+    def set(self, level, version: int):
+        # version is the cache version from before the level was read
+        if version != self.version or self.max_size <= 0:
+            return
+        # not importing database.models here, which imports this module through the DAL
+        copy = type(level)(**{
+            attribute.key: getattr(level, attribute.key) for attribute in inspect(level).mapper.column_attrs
+        })
+        make_transient_to_detached(copy)
+        self.entries[level.level_id] = (time.monotonic() + self.ttl, copy)
+        self.entries.move_to_end(level.level_id)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def invalidate(self, level_ids):
+        self.version += 1
+        for level_id in level_ids:
+            self.entries.pop(level_id, None)
+
+    def clear(self):
+        self.version += 1
+        self.entries.clear()
+
+
+level_cache = LevelCache(max_size=DATABASE_LEVEL_CACHE_SIZE, ttl=DATABASE_LEVEL_CACHE_TTL)
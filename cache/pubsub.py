@@ -0,0 +1,50 @@
+import asyncio
+import json
+from typing import Callable
+
+from loguru import logger
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+'''
+Invalidation messages of process-local caches, a JSON list of stale keys per message.
+'''
+
+
+async def publish_invalidation(
+        redis: Redis,
+        channel: str,
+        keys: list[str]
+):
+    await redis.publish(channel, json.dumps(keys, separators=(',', ':')))
+
+
+async def listen_invalidations(
+        redis: Redis,
+        channel: str,
+        invalidate: Callable[[list[str]], None],
+        reset: Callable[[], None]
+):
+    # keep a process-local cache consistent with other workers, runs as a background task
+    # messages published while not subscribed are lost, so the whole cache is reset on (re)subscribe
+    while True:
+        pubsub = redis.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(channel)
+            reset()
+            async for message in pubsub.listen():
+                try:
+                    keys = json.loads(message["data"])
+                    if not isinstance(keys, list):
+                        raise TypeError(f"expected a list of keys, got {type(keys).__name__}")
+                    invalidate(keys)
+                except (ValueError, TypeError) as e:
+                    # the stale keys of a malformed message are unknown, so drop them all
+                    logger.error(f"Malformed invalidation on {channel}: {e!r}")
+                    reset()
+        except RedisError as e:
+            logger.warning(f"Lost subscription to {channel}: {e}")
+            reset()
+        finally:
+            await pubsub.reset()
+        await asyncio.sleep(1)
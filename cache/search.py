@@ -0,0 +1,58 @@
+import json
+
+from loguru import logger
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+'''
+search:{version}:{signature} -> shared part of a detailed search page
+The per-user like and clear flags of a cached page are stale, callers overlay the requesting user's own.
+A Redis error is logged and treated as a cache miss, requests fall through to the database.
+'''
+
+SEARCH_CACHE_EXPIRE: int = 60  # 1 minute, bounds the staleness of level stats on cached pages
+
+# Hit and miss counters of this worker
+search_cache_stats: dict[str, int] = {
+    "hits": 0,
+    "misses": 0,
+}
+
+
+async def get_cached_search_page(
+        redis: Redis,
+        version: int,
+        signature: str
+) -> tuple[list[int], dict] | None:
+    # returns (level data ids, DetailedSearchResults dump)
+    try:
+        data = await redis.get(f"search:{version}:{signature}")
+    except RedisError as e:
+        logger.warning(f"Failed to get cached search page: {e}")
+        return None
+    if data is None:
+        search_cache_stats["misses"] += 1
+        return None
+    search_cache_stats["hits"] += 1
+    cached = json.loads(data)
+    return cached["level_ids"], cached["page"]
+
+
+async def set_cached_search_page(
+        redis: Redis,
+        version: int,
+        signature: str,
+        level_ids: list[int],
+        page: dict
+):
+    try:
+        await redis.set(
+            f"search:{version}:{signature}",
+            json.dumps(
+                {"level_ids": level_ids, "page": page},
+                separators=(',', ':')
+            ),
+            ex=SEARCH_CACHE_EXPIRE
+        )
+    except RedisError as e:
+        logger.warning(f"Failed to cache search page: {e}")
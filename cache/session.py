@@ -0,0 +1,53 @@
+import time
+from collections import OrderedDict
+
+from config import SESSION_CACHE_TTL, SESSION_CACHE_SIZE
+
+'''
+session_cache:invalidate -> pub/sub channel of session ids dropped or replaced by a new login
+Published by the session scripts in session/session_access.py.
+'''
+
+SESSION_CACHE_CHANNEL: str = "session_cache:invalidate"
+
+
+class SessionCache:
+    # short-lived cache of decoded sessions by session id in this worker
+    # all entries have the same TTL, so insertion order is expiry order
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries: OrderedDict[str, tuple[float, object]] = OrderedDict()
+        # bumped on every invalidation, so sessions read before it are not cached afterwards
+        self.version: int = 0
+
+    def get(self, session_id: str):
+        entry = self.entries.get(session_id)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def set(self, session_id: str, session, version: int):
+        # version is the cache version from before the session was read
+        if version != self.version or self.max_size <= 0:
+            return
+        now = time.monotonic()
+        self.entries.pop(session_id, None)
+        self.entries[session_id] = (now + self.ttl, session)
+        while self.entries:
+            oldest_session_id, (expires_at, _) = next(iter(self.entries.items()))
+            if expires_at >= now and len(self.entries) <= self.max_size:
+                break
+            del self.entries[oldest_session_id]
+
+    def invalidate(self, session_ids):
+        self.version += 1
+        for session_id in session_ids:
+            self.entries.pop(session_id, None)
+
+    def clear(self):
+        self.version += 1
+        self.entries.clear()
+
+
+session_cache = SessionCache(max_size=SESSION_CACHE_SIZE, ttl=SESSION_CACHE_TTL)
@@ -0,0 +1,81 @@
+from collections import OrderedDict
+
+from redis.asyncio import Redis
+
+from config import DATABASE_USER_NAME_CACHE_SIZE
+
+'''
+user_names -> hash of user id to username, UNKNOWN_USER for user ids without a user
+user_name_cache:invalidate -> pub/sub channel of user ids whose names changed
+Both are written by DBAccessLayer.commit() after users are added or renamed.
+'''
+
+USER_NAME_CACHE_CHANNEL: str = "user_name_cache:invalidate"
+UNKNOWN_USER: str = ""
+
+
+class UserNameCache:
+    # bounded LRU cache of usernames by user id in this worker, in front of the user_names hash
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.entries: OrderedDict[int, str] = OrderedDict()
+        # bumped on every invalidation, so names read before it are not cached afterwards
+        self.version: int = 0
+
+    def get_many(self, user_ids) -> dict[int, str]:
+        user_names: dict[int, str] = {}
+        for user_id in user_ids:
+            user_name = self.entries.get(user_id)
+            if user_name is not None:
+                self.entries.move_to_end(user_id)
+                user_names[user_id] = user_name
+        return user_names
+
+    def set_many(self, user_names: dict[int, str], version: int):
+        # version is the cache version from before the names were read
+        if version != self.version or self.max_size <= 0:
+            return
+        for user_id, user_name in user_names.items():
+            self.entries[user_id] = user_name
+            self.entries.move_to_end(user_id)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, user_ids):
+        self.version += 1
+        for user_id in user_ids:
+            self.entries.pop(int(user_id), None)
+
+    def clear(self):
+        self.version += 1
+        self.entries.clear()
+
+
+user_name_cache = UserNameCache(max_size=DATABASE_USER_NAME_CACHE_SIZE)
+
+
+async def get_cached_user_names(
+        redis: Redis,
+        user_ids: list[int]
+) -> dict[int, str]:
+    user_names = await redis.hmget("user_names", user_ids)
+    return {
+        user_id: user_name.decode() for user_id, user_name in zip(user_ids, user_names) if user_name is not None
+    }
+
+
+async def set_cached_user_names(
+        redis: Redis,
+        user_names: dict[int, str]
+):
+    # unknown users never overwrite a name, which may have been set by a concurrent registration
+    async with redis.pipeline(transaction=False) as pipe:
+        known_user_names = {
+            user_id: user_name for user_id, user_name in user_names.items() if user_name != UNKNOWN_USER
+        }
+        if known_user_names:
+            pipe.hset("user_names", mapping=known_user_names)
+        for user_id, user_name in user_names.items():
+            if user_name == UNKNOWN_USER:
+                pipe.hsetnx("user_names", user_id, UNKNOWN_USER)
+        await pipe.execute()
@@ -1,6 +1,7 @@
 import base64
 from dataclasses import dataclass
 from enum import Enum
+from functools import lru_cache
 import hashlib
 import re
 
@@ -34,7 +35,8 @@ def level_to_details(level_data: Level, locale: str, level_file_url: str, mobile
                      clear_type: str,
                      author: str, record_user: str):
     if mobile and level_data.non_latin:
-        name: str = string_latinify(level_data.name)
+        # levels uploaded before Level.latin_name existed are converted on the fly
+        name: str = level_data.latin_name or string_latinify(level_data.name)
     else:
         name: str = level_data.name
     if level_data.record != 0:
@@ -102,13 +104,16 @@ def calculate_password_hash(password: str):
     return hashlib.sha256(base64.b64encode(password.encode('utf-8'))).hexdigest()
 
 
-def string_latinify(t):
-    table = {ord(f): ord(t) for f, t in zip(u'，。！？【】（）％＃＠＆－—〔〕：；〇﹒—﹙﹚、—“”', u',.!?[]()%#@&--():;0.—(),-""')}
+_latinify_table = {ord(f): ord(t) for f, t in zip(u'，。！？【】（）％＃＠＆－—〔〕：；〇﹒—﹙﹚、—“”', u',.!?[]()%#@&--():;0.—(),-""')}
+_pinyin = Pinyin()  # Loading the pinyin dictionary is expensive, so it is loaded once at import
+
 
+@lru_cache(maxsize=4096)
+def string_latinify(t):
     try:
-        t2 = t.translate(table)
+        t2 = t.translate(_latinify_table)
     except:
         t2 = t
-    t2 = Pinyin().get_pinyin(t2).replace('-', ' ')
+    t2 = _pinyin.get_pinyin(t2).replace('-', ' ')
     t2 = re.sub(u'[^\x00-\x7F\x80-\xFF\u0100-\u017F\u0180-\u024F\u1E00-\u1EFF]', u'', t2)
     return t2
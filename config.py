@@ -39,11 +39,33 @@ DATABASE_PASS = _config['database']['password']
 DATABASE_NAME = _config['database']['database']
 DATABASE_SSL = _config['database']['ssl']
 DATABASE_DEBUG = _config['database']['debug']
+DATABASE_POOL_SIZE = _config['database']['pool_size']
+DATABASE_MAX_OVERFLOW = _config['database']['max_overflow']
+DATABASE_POOL_TIMEOUT = _config['database']['pool_timeout']
+DATABASE_POOL_RECYCLE = _config['database']['pool_recycle']
+DATABASE_POOL_PRE_PING = _config['database']['pool_pre_ping']
+DATABASE_STATEMENT_CACHE_SIZE = _config['database']['statement_cache_size']
+DATABASE_SQLITE_BUSY_TIMEOUT = _config['database']['sqlite_busy_timeout']
+DATABASE_SQLITE_MMAP_SIZE = _config['database']['sqlite_mmap_size']
+DATABASE_SQLITE_GROUP_COMMIT = _config['database']['sqlite_group_commit']
+DATABASE_SQLITE_GROUP_COMMIT_WINDOW = _config['database']['sqlite_group_commit_window']
+DATABASE_COUNTER_BUFFER = _config['database']['counter_buffer']
+DATABASE_COUNTER_FLUSH_INTERVAL = _config['database']['counter_flush_interval']
+DATABASE_LEVEL_CACHE_SIZE = _config['database']['level_cache_size']
+DATABASE_LEVEL_CACHE_TTL = _config['database']['level_cache_ttl']
+DATABASE_USER_NAME_CACHE_SIZE = _config['database']['user_name_cache_size']
+DATABASE_REPLICAS = _config['database']['replicas']
+DATABASE_REPLICA_STICKINESS = _config['database']['replica_stickiness']
 
 SESSION_REDIS_HOST = _config['redis']['host']
 SESSION_REDIS_PORT = _config['redis']['port']
 SESSION_REDIS_DB = _config['redis']['database']
 SESSION_REDIS_PASS = _config['redis']['password']
+SESSION_CACHE_TTL = _config['redis']['session_cache_ttl']
+SESSION_CACHE_SIZE = _config['redis']['session_cache_size']
+
+SESSION_SIGNED = _config['session']['signed']
+SESSION_SECRET = _config['session']['secret']
 
 STORAGE_PROVIDER = _config['storage']['provider']
 STORAGE_URL = _config['storage']['url']
@@ -0,0 +1,364 @@
+# Benchmarks of database access patterns, run from the server directory:
+#   python -m database.benchmark <benchmark> [sizes...]
+# Each benchmark runs against its own temporary SQLite database, sizes default to the ones in BENCHMARKS.
+
+import argparse
+import asyncio
+import datetime
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import event, select, insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from config import ROWS_PERPAGE, DATABASE_SQLITE_GROUP_COMMIT_WINDOW
+from database.db import Base, apply_sqlite_profile
+from database.db_access import DBAccessLayer
+from database.group_commit import GroupCommitWriter
+from database.models import Level, LikeUsers, ClearedUsers
+from database.migrate import index_missing_titles
+from routers.stage import keyset_condition
+
+FIXTURE_CHUNK_SIZE: int = 10000  # Rows per INSERT while building fixtures
+
+
+class Counters:
+    def __init__(self, engine):
+        self.counts: dict[str, int] = {"checkouts": 0, "begins": 0, "commits": 0, "rollbacks": 0}
+        event.listen(engine.sync_engine, 'checkout', lambda *args: self.count("checkouts"))
+        event.listen(engine.sync_engine, 'begin', lambda *args: self.count("begins"))
+        event.listen(engine.sync_engine, 'commit', lambda *args: self.count("commits"))
+        event.listen(engine.sync_engine, 'rollback', lambda *args: self.count("rollbacks"))
+
+    def count(self, name: str):
+        self.counts[name] += 1
+
+    def take(self) -> dict[str, int]:
+        counts = self.counts.copy()
+        for name in self.counts:
+            self.counts[name] = 0
+        return counts
+
+
+async def create_database(directory: str, name: str):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(directory, name)}")
+    event.listen(engine.sync_engine, 'connect', apply_sqlite_profile)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    return engine
+
+
+async def add_levels(engine, count: int, name=lambda i: f'Level {i}'):
+    # levels with random stats, ids 1 to count
+    rng = random.Random(count)
+    today = datetime.date.today()
+    async with engine.begin() as conn:
+        for start in range(0, count, FIXTURE_CHUNK_SIZE):
+            rows = []
+            for i in range(start, min(start + FIXTURE_CHUNK_SIZE, count)):
+                likes, dislikes = rng.randrange(100), rng.randrange(20)
+                rows.append({
+                    'id': i + 1, 'level_id': f'{i:016X}', 'name': name(i), 'likes': likes, 'dislikes': dislikes,
+                    'plays': 100, 'deaths': 0, 'clears': rng.randrange(100), 'score': likes - dislikes,
+                    'style': 0, 'environment': 0, 'tag_1': 0, 'tag_2': 0, 'description': '',
+                    'date': today, 'author_id': i % 1000, 'non_latin': False, 'featured': False,
+                    'record_user_id': 0, 'record': 0, 'testing_client': False
+                })
+            await conn.execute(insert(Level), rows)
+
+
+async def timed(run, repeat: int) -> float:
+    # median milliseconds of run()
+    durations: list[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await run()
+        durations.append((time.perf_counter() - start) * 1000)
+    return statistics.median(durations)
+
+
+async def eager_dal(session_maker, handler):
+    # create_dal before lazy sessions
+    async with session_maker() as session:
+        async with session.begin():
+            await handler(DBAccessLayer(session))
+
+
+async def lazy_dal(session_maker, handler):
+    dal = DBAccessLayer(session_maker=session_maker)
+    try:
+        await handler(dal)
+        await dal.finish()
+    finally:
+        await dal.close()
+
+
+async def read_only_dal(session_maker, handler):
+    dal = DBAccessLayer(session_maker=session_maker, read_only=True)
+    try:
+        await handler(dal)
+    finally:
+        await dal.close()
+
+
+async def no_query(dal: DBAccessLayer):
+    # e.g. rejected by form validation or served from cache
+    pass
+
+
+async def listing(dal: DBAccessLayer):
+    await dal.get_level_count(select(Level))
+    await dal.execute_selection(select(Level).limit(10))
+
+
+async def benchmark_sessions(directory: str, sizes: list[int]):
+    # pool checkouts and transaction statements per request of the DAL dependencies, and their latency
+    # the counts do not depend on the adapter, the latency is SQLite's, without network round trips
+    requests: int = sizes[0]
+    engine = await create_database(directory, 'sessions.db')
+    counters = Counters(engine)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    read_only_session_maker = async_sessionmaker(
+        engine.execution_options(isolation_level='AUTOCOMMIT'), expire_on_commit=False
+    )
+    print(f"{'dependency':<16}{'handler':<12}" + ''.join(f"{name:>12}" for name in counters.counts)
+          + f"{'us/request':>12}")
+    for dependency_name, dependency, dependency_session_maker in (
+            ('eager', eager_dal, session_maker),
+            ('lazy', lazy_dal, session_maker),
+            ('read-only', read_only_dal, read_only_session_maker),
+    ):
+        for handler in (no_query, listing):
+            start = time.perf_counter()
+            for _ in range(requests):
+                await dependency(dependency_session_maker, handler)
+            duration = (time.perf_counter() - start) / requests * 1000000
+            counts = counters.take()
+            print(f"{dependency_name:<16}{handler.__name__:<12}" + ''.join(
+                f"{counts[name] / requests:>12.2f}" for name in counts
+            ) + f"{duration:>12.1f}")
+    await engine.dispose()
+
+
+async def benchmark_pagination(directory: str, sizes: list[int]):
+    # latency of one detailed search page by OFFSET and by keyset cursor, on the first and a deep page
+    for size in sizes:
+        engine = await create_database(directory, f'pagination-{size}.db')
+        await add_levels(engine, size)
+        session_maker = async_sessionmaker(engine, expire_on_commit=False)
+        deep_page: int = min(5000, size // ROWS_PERPAGE)
+        print(f"{size} levels, page 1 and page {deep_page}, median ms")
+        print(f"{'listing':<12}{'mode':<10}{'page 1':>12}{f'page {deep_page}':>12}")
+        for listing_name, order_key, order_key_value in (
+                ('latest', None, None),
+                ('popular', Level.score, lambda level: level.score),
+        ):
+            selection = select(Level).where(Level.testing_client == False)
+            if order_key is not None:
+                selection = selection.order_by(order_key.desc())
+            selection = selection.order_by(Level.id.desc())
+            async with session_maker() as session:
+                # the cursor the previous page would have returned
+                last_level = (await session.execute(
+                    selection.offset((deep_page - 1) * ROWS_PERPAGE - 1).limit(1)
+                )).scalars().first()
+            after_key = order_key_value(last_level) if order_key_value is not None else None
+            for mode in ('offset', 'cursor'):
+                durations: list[float] = []
+                for page in (1, deep_page):
+                    if mode == 'offset':
+                        page_selection = selection.offset((page - 1) * ROWS_PERPAGE).limit(ROWS_PERPAGE)
+                    elif page == 1:
+                        page_selection = selection.limit(ROWS_PERPAGE)
+                    else:
+                        page_selection = selection.where(
+                            keyset_condition(order_key, True, after_key, last_level.id)
+                        ).limit(ROWS_PERPAGE)
+
+                    async def run():
+                        async with session_maker() as session:
+                            await DBAccessLayer(session).execute_selection(page_selection)
+                    durations.append(await timed(run, 20))
+                print(f"{listing_name:<12}{mode:<10}" + ''.join(f"{duration:>12.2f}" for duration in durations))
+        await engine.dispose()
+
+
+async def add_user_rows(engine, model, user_id: int, level_ids: list[int]):
+    async with engine.begin() as conn:
+        for start in range(0, len(level_ids), FIXTURE_CHUNK_SIZE):
+            await conn.execute(insert(model), [
+                {'parent_id': level_id, 'user_id': user_id} for level_id in level_ids[start:start + FIXTURE_CHUNK_SIZE]
+            ])
+
+
+async def in_list_filter(dal: DBAccessLayer, user_id: int, name: str):
+    # the filters before EXISTS subqueries, the user's rows loaded and deduplicated in Python
+    rows = await (dal.get_liked_levels_by_user if name == 'liked' else dal.get_cleared_levels_by_user)(user_id)
+    level_data_ids: list[int] = []
+    for row in rows:
+        if row.parent_id not in level_data_ids:
+            level_data_ids.append(row.parent_id)
+    if name == 'not cleared':
+        return Level.id.not_in(level_data_ids)
+    return Level.id.in_(level_data_ids)
+
+
+async def exists_filter(dal: DBAccessLayer, user_id: int, name: str):
+    match name:
+        case 'liked':
+            return dal.liked_by_user(user_id)
+        case 'cleared':
+            return dal.cleared_by_user(user_id)
+        case _:
+            return ~dal.cleared_by_user(user_id)
+
+
+async def benchmark_filters(directory: str, sizes: list[int]):
+    # count and first page of the liked, cleared and not cleared listings of a user with many clears,
+    # by IN lists built in Python and by EXISTS subqueries
+    for size in sizes:
+        engine = await create_database(directory, f'filters-{size}.db')
+        level_count: int = size * 5
+        await add_levels(engine, level_count)
+        rng = random.Random(size)
+        # the user under test, and the clears and likes of other users in the same tables
+        await add_user_rows(engine, ClearedUsers, 1, rng.sample(range(1, level_count + 1), size))
+        await add_user_rows(engine, LikeUsers, 1, rng.sample(range(1, level_count + 1), size // 4))
+        for user_id in range(2, 12):
+            await add_user_rows(engine, ClearedUsers, user_id, rng.sample(range(1, level_count + 1), size))
+            await add_user_rows(engine, LikeUsers, user_id, rng.sample(range(1, level_count + 1), size // 4))
+        session_maker = async_sessionmaker(engine, expire_on_commit=False)
+        print(f"{level_count} levels, user with {size} clears and {size // 4} likes, median ms")
+        print(f"{'filter':<14}{'in list':>12}{'exists':>12}")
+        for name in ('liked', 'cleared', 'not cleared'):
+            durations: list[float] = []
+            for build_filter, repeat in ((in_list_filter, 3), (exists_filter, 10)):
+                async def run():
+                    async with session_maker() as session:
+                        dal = DBAccessLayer(session)
+                        selection = select(Level).where(
+                            Level.testing_client == False, await build_filter(dal, 1, name)
+                        )
+                        await dal.get_level_count(selection)
+                        await dal.execute_selection(selection.order_by(Level.id.desc()).limit(ROWS_PERPAGE))
+                durations.append(await timed(run, repeat))
+            print(f"{name:<14}" + ''.join(f"{duration:>12.2f}" for duration in durations))
+        await engine.dispose()
+
+
+TITLE_SYLLABLES: tuple[str, ...] = (
+    'ka', 'ri', 'to', 'mo', 'su', 'ne', 'la', 'po', 'zi', 'xu', 'ber', 'tan', 'gol', 'vin', 'dra', 'shi', 'kou',
+    'mar', 'ion', 'ex'
+)
+TITLE_COMMON_WORDS: tuple[str, ...] = ('mario', 'castle', 'kaizo', 'speedrun', '马里奥', '城堡')
+TITLE_QUERIES: tuple[str, ...] = ('mario', 'castle kaizo', '马里奥', 'tanto', 'vinexdra lavin', 'nothing like this')
+
+
+def title_words(rng: random.Random) -> list[str]:
+    # made-up words from syllables, and a few words common in level names
+    return [''.join(rng.choices(TITLE_SYLLABLES, k=rng.randint(2, 3))) for _ in range(3000)] + \
+        list(TITLE_COMMON_WORDS)
+
+
+async def benchmark_title_search(directory: str, sizes: list[int]):
+    # count and first page of a title search, by the n-gram index and by LIKE alone
+    for size in sizes:
+        engine = await create_database(directory, f'titles-{size}.db')
+        rng = random.Random(size)
+        words: list[str] = title_words(rng)
+        await add_levels(engine, size, name=lambda i: ' '.join(rng.choices(words, k=rng.randint(2, 4))))
+        await index_missing_titles(engine)
+        session_maker = async_sessionmaker(engine, expire_on_commit=False)
+        print(f"{size} levels, median ms")
+        print(f"{'title':<20}{'levels':>10}{'n-grams':>12}{'like':>12}")
+        for title in TITLE_QUERIES:
+            durations: list[float] = []
+            for use_index in (True, False):
+                async def run():
+                    async with session_maker() as session:
+                        dal = DBAccessLayer(session)
+                        title_filter = dal.title_contains(title) if use_index else \
+                            Level.name.contains(title, autoescape=True)
+                        selection = select(Level).where(Level.testing_client == False, title_filter)
+                        run.count = await dal.get_level_count(selection)
+                        await dal.execute_selection(selection.order_by(Level.id.desc()).limit(ROWS_PERPAGE))
+                durations.append(await timed(run, 5))
+            print(f"{title:<20}{run.count:>10}" + ''.join(f"{duration:>12.2f}" for duration in durations))
+        await engine.dispose()
+
+
+GROUP_COMMIT_WRITES: int = 2000  # Stats writes per run of the group-commit benchmark
+GROUP_COMMIT_LEVELS: int = 100  # Levels the writes are spread over
+
+
+async def stats_write(session_maker, writer, level_id: str):
+    # a play of stats_intentos_handler without the counter buffer
+    dal = DBAccessLayer(session_maker=session_maker, writer=writer)
+    try:
+        await dal.add_play_to_level(level_id)
+        await dal.commit()
+    finally:
+        await dal.close()
+
+
+async def benchmark_group_commit(directory: str, sizes: list[int]):
+    # throughput of SQLite stats writes by concurrent requests, each committing on its own
+    # or through the group commit writer, sizes are the numbers of concurrent requests
+    engine = await create_database(directory, 'group-commit.db')
+    await add_levels(engine, GROUP_COMMIT_LEVELS)
+    counters = Counters(engine)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    level_ids: list[str] = [f'{i:016X}' for i in range(GROUP_COMMIT_LEVELS)]
+    print(f"{GROUP_COMMIT_WRITES} writes over {GROUP_COMMIT_LEVELS} levels")
+    print(f"{'concurrency':<14}{'mode':<14}{'writes/s':>12}{'commits':>12}")
+    for concurrency in sizes:
+        for mode in ('per request', 'group commit'):
+            writer = None
+            if mode == 'group commit':
+                writer_engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(directory, 'group-commit.db')}")
+                event.listen(writer_engine.sync_engine, 'connect', apply_sqlite_profile)
+                writer = GroupCommitWriter(redis=None, window=DATABASE_SQLITE_GROUP_COMMIT_WINDOW, engine=writer_engine)
+                writer.start()
+            rng = random.Random(concurrency)
+
+            async def client(writes: int):
+                for _ in range(writes):
+                    await stats_write(session_maker, writer, rng.choice(level_ids))
+            start = time.perf_counter()
+            await asyncio.gather(*(
+                client(GROUP_COMMIT_WRITES // concurrency + (i < GROUP_COMMIT_WRITES % concurrency))
+                for i in range(concurrency)
+            ))
+            duration = time.perf_counter() - start
+            commits = counters.take()["commits"]
+            if writer is not None:
+                commits = writer.stats["commits"]
+                await writer.close()
+            print(f"{concurrency:<14}{mode:<14}{GROUP_COMMIT_WRITES / duration:>12.0f}{commits:>12}")
+    await engine.dispose()
+
+
+BENCHMARKS = {
+    'sessions': (benchmark_sessions, [1000]),
+    'pagination': (benchmark_pagination, [500000]),
+    'filters': (benchmark_filters, [20000]),
+    'title-search': (benchmark_title_search, [100000, 1000000]),
+    'group-commit': (benchmark_group_commit, [1, 16, 256]),
+}
+
+
+async def main(benchmark: str, sizes: list[int]):
+    run, default_sizes = BENCHMARKS[benchmark]
+    with tempfile.TemporaryDirectory() as directory:
+        await run(directory, sizes or default_sizes)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Engine Tribe database benchmarks')
+    parser.add_argument('benchmark', choices=BENCHMARKS.keys())
+    parser.add_argument('sizes', type=int, nargs='*', help='requests or levels, several sizes run one by one')
+    arguments = parser.parse_args()
+    asyncio.run(main(arguments.benchmark, arguments.sizes))
@@ -0,0 +1,146 @@
+import asyncio
+from uuid import uuid4
+
+from loguru import logger
+from redis.asyncio import Redis
+
+from database.db import Database
+from database.db_access import DBAccessLayer
+from database.models import Level
+
+'''
+counter:{level data id} -> live counters of a level, database value plus increments not yet written
+counter:pending -> {level data id}:{field} -> increments not yet written to database
+counter:flushing:{flush id} -> increments being written to database by a worker
+counter:lease:{flush id} -> exists while the worker may still be writing them
+counter:flushes -> set of flush ids, whose increments are handed back once their lease is gone
+'''
+
+BUFFERED_FIELDS: tuple[str, ...] = ('plays', 'deaths', 'clears', 'likes', 'dislikes')
+LIVE_COUNTER_EXPIRE: int = 60 * 60 * 24  # 1 day, refreshed on every increment
+# Seconds a flush may take before its increments are handed back to the pending hash
+# A worker still writing after that would count them twice, so this is far above any database timeout
+FLUSH_LEASE: int = 60 * 10
+
+# KEYS[1]: live counters, KEYS[2]: pending increments
+# ARGV[1]: field, ARGV[2]: amount, ARGV[3]: pending field, ARGV[4]: expire
+# ARGV[5...]: field and value pairs from database, to seed the live counters
+INCR_SCRIPT = '''
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    redis.call('HSET', KEYS[1], unpack(ARGV, 5))
+end
+local value = redis.call('HINCRBY', KEYS[1], ARGV[1], ARGV[2])
+redis.call('HINCRBY', KEYS[2], ARGV[3], ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return value
+'''
+
+# KEYS[1]: pending increments, KEYS[2]: flushing key, KEYS[3]: lease key, KEYS[4]: set of flushes
+# ARGV[1]: flush id, ARGV[2]: lease
+TAKE_PENDING_SCRIPT = '''
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return {}
+end
+redis.call('RENAME', KEYS[1], KEYS[2])
+redis.call('SET', KEYS[3], 1, 'EX', ARGV[2])
+redis.call('SADD', KEYS[4], ARGV[1])
+return redis.call('HGETALL', KEYS[2])
+'''
+
+# KEYS[1]: pending increments, KEYS[2]: flushing key, KEYS[3]: lease key, KEYS[4]: set of flushes
+# ARGV[1]: flush id
+# hands back the increments of a flush whose worker died, returns the number of fields handed back
+RECOVER_SCRIPT = '''
+if redis.call('EXISTS', KEYS[3]) == 1 then
+    return 0
+end
+local increments = redis.call('HGETALL', KEYS[2])
+for i = 1, #increments, 2 do
+    redis.call('HINCRBY', KEYS[1], increments[i], increments[i + 1])
+end
+redis.call('DEL', KEYS[2])
+redis.call('SREM', KEYS[4], ARGV[1])
+return #increments / 2
+'''
+
+
+def flush_keys(flush_id: str) -> list[str]:
+    # keys of the flush scripts
+    return ["counter:pending", f"counter:flushing:{flush_id}", f"counter:lease:{flush_id}", "counter:flushes"]
+
+
+class CounterBuffer:
+    # Write-behind buffer of level stats
+    # Increments are counted in Redis and written to database in batches every flush_interval seconds,
+    # instead of one read-modify-write transaction per game event.
+    def __init__(self, redis: Redis, database: Database, flush_interval: float):
+        self.redis = redis
+        self.db = database
+        self.flush_interval = flush_interval
+        self.incr_script = redis.register_script(INCR_SCRIPT)
+        self.take_pending_script = redis.register_script(TAKE_PENDING_SCRIPT)
+        self.recover_script = redis.register_script(RECOVER_SCRIPT)
+
+    async def incr(self, level: Level, field: str, amount: int = 1) -> int:
+        # returns the new value of the counter, including increments not yet written to database
+        # every value is returned exactly once, so milestones can be checked with ==
+        seed: list = []
+        for seed_field in BUFFERED_FIELDS:
+            seed += [seed_field, getattr(level, seed_field)]
+        return int(await self.incr_script(
+            keys=[f"counter:{level.id}", "counter:pending"],
+            args=[field, amount, f"{level.id}:{field}", LIVE_COUNTER_EXPIRE, *seed]
+        ))
+
+    async def flush(self):
+        flush_id: str = uuid4().hex
+        keys: list[str] = flush_keys(flush_id)
+        pending: list = await self.take_pending_script(keys=keys, args=[flush_id, FLUSH_LEASE])
+        if not pending:
+            return
+        increments: dict[int, dict[str, int]] = {}
+        for pending_field, amount in zip(pending[0::2], pending[1::2]):
+            level_data_id, field = pending_field.decode().split(':')
+            increments.setdefault(int(level_data_id), {'id': int(level_data_id)})[field] = int(amount)
+        try:
+            async with self.db.async_session() as session:
+                async with session.begin():
+                    dal = DBAccessLayer(session, self.redis)
+                    await dal.apply_counter_increments(list(increments.values()))
+                    await dal.commit()
+        except Exception as e:
+            # hand the increments back, the next flush retries them
+            logger.error(f"Failed to flush level counters: {e}")
+            async with self.redis.pipeline(transaction=True) as pipe:
+                for pending_field, amount in zip(pending[0::2], pending[1::2]):
+                    pipe.hincrby("counter:pending", pending_field, int(amount))
+                await self.finish_flush(pipe, flush_id).execute()
+            return
+        async with self.redis.pipeline(transaction=True) as pipe:
+            await self.finish_flush(pipe, flush_id).execute()
+        logger.info(f"Flushed counters of {len(increments)} levels")
+
+    def finish_flush(self, pipe, flush_id: str):
+        _, flushing_key, lease_key, flushes_key = flush_keys(flush_id)
+        return pipe.delete(flushing_key, lease_key).srem(flushes_key, flush_id)
+
+    async def recover(self, scan: bool = False):
+        # hand back increments of flushes whose worker died before writing or handing them back
+        if scan:
+            # flushing keys left by workers that did not register their flushes yet have no lease
+            async for flushing_key in self.redis.scan_iter(match="counter:flushing:*"):
+                await self.redis.sadd("counter:flushes", flushing_key.decode().removeprefix("counter:flushing:"))
+        for flush_id in await self.redis.smembers("counter:flushes"):
+            flush_id = flush_id.decode()
+            recovered: int = await self.recover_script(keys=flush_keys(flush_id), args=[flush_id])
+            if recovered:
+                logger.warning(f"Recovered {recovered} counter increments of an interrupted flush")
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.recover()
+                await self.flush()
+            except Exception as e:
+                logger.error(e)
@@ -7,6 +7,8 @@ from sqlalchemy.ext.asyncio import (
     async_sessionmaker
 )
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy import inspect, event
+import random
 import ssl
 
 
@@ -14,39 +16,122 @@ class Base(AsyncAttrs, DeclarativeBase):
     pass
 
 
+def create_engine(host: str, port: int) -> AsyncEngine:
+    match DATABASE_ADAPTER:
+        case 'mysql':
+            database_type = 'mysql+asyncmy'
+        case 'postgresql':
+            database_type = 'postgresql+asyncpg'
+        case 'sqlite':
+            database_type = 'sqlite+aiosqlite'
+        case _:
+            raise ValueError('Invalid database adapter')
+    if DATABASE_ADAPTER == 'sqlite':
+        # host is the database file
+        url: str = f'{database_type}:///{host}'
+    else:
+        url: str = f'{database_type}://{DATABASE_USER}:{DATABASE_PASS}@{host}:{port}/{DATABASE_NAME}'
+    if DATABASE_SSL:
+        ssl_ctx = ssl.create_default_context(cafile="/etc/ssl/certs/ca-certificates.crt")
+        ssl_ctx.verify_mode = ssl.CERT_REQUIRED
+        connect_args = {
+            'ssl': ssl_ctx
+        }
+    else:
+        connect_args = {}
+    if DATABASE_ADAPTER == 'postgresql':
+        connect_args['prepared_statement_cache_size'] = DATABASE_STATEMENT_CACHE_SIZE
+    engine: AsyncEngine = create_async_engine(
+        url=url,
+        echo=DATABASE_DEBUG, future=True,
+        connect_args=connect_args,
+        pool_size=DATABASE_POOL_SIZE,
+        max_overflow=DATABASE_MAX_OVERFLOW,
+        pool_timeout=DATABASE_POOL_TIMEOUT,
+        pool_recycle=DATABASE_POOL_RECYCLE,
+        pool_pre_ping=DATABASE_POOL_PRE_PING,
+        query_cache_size=DATABASE_STATEMENT_CACHE_SIZE
+    )
+    if DATABASE_ADAPTER == 'sqlite':
+        event.listen(engine.sync_engine, 'connect', apply_sqlite_profile)
+    return engine
+
+
+def apply_sqlite_profile(dbapi_connection, connection_record):
+    # WAL lets readers run alongside the writer, and writers wait for the lock instead of failing
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')  # durable with WAL except on power loss, no fsync per commit
+    cursor.execute(f'PRAGMA busy_timeout={int(DATABASE_SQLITE_BUSY_TIMEOUT)}')
+    cursor.execute(f'PRAGMA mmap_size={int(DATABASE_SQLITE_MMAP_SIZE)}')
+    cursor.close()
+
+
 class Database:
     def __init__(self):
-        match DATABASE_ADAPTER:
-            case 'mysql':
-                database_type = 'mysql+asyncmy'
-            case 'postgresql':
-                database_type = 'postgresql+asyncpg'
-            case 'sqlite':
-                database_type = 'sqlite+aiosqlite'
-            case _:
-                raise ValueError('Invalid database adapter')
-        url: str = f'{database_type}://{DATABASE_USER}:{DATABASE_PASS}@{DATABASE_HOST}:{DATABASE_PORT}/{DATABASE_NAME}'
-        if DATABASE_SSL:
-            ssl_ctx = ssl.create_default_context(cafile="/etc/ssl/certs/ca-certificates.crt")
-            ssl_ctx.verify_mode = ssl.CERT_REQUIRED
-            connect_args = {
-                'ssl': ssl_ctx
-            }
-        else:
-            connect_args = {}
-        self.engine: AsyncEngine = create_async_engine(
-            url=url,
-            echo=DATABASE_DEBUG, future=True,
-            connect_args=connect_args
-        )
+        self.engine: AsyncEngine = create_engine(DATABASE_HOST, DATABASE_PORT)
         # Base.metadata.create_all(self.engine)
         self.async_session: async_sessionmaker[AsyncSession] = async_sessionmaker(
             self.engine,
             expire_on_commit=False
         )
+        # sessions for read-only requests, no transaction round trips
+        self.read_only_session: async_sessionmaker[AsyncSession] = async_sessionmaker(
+            self.engine.execution_options(isolation_level='AUTOCOMMIT'),
+            expire_on_commit=False
+        )
+        # read replicas, same schema and credentials as the primary
+        self.replica_engines: list[AsyncEngine] = [
+            create_engine(replica['host'], replica.get('port', DATABASE_PORT)) for replica in DATABASE_REPLICAS
+        ]
+        self.replica_sessions: list[async_sessionmaker[AsyncSession]] = [
+            async_sessionmaker(
+                engine.execution_options(isolation_level='AUTOCOMMIT'),
+                expire_on_commit=False
+            ) for engine in self.replica_engines
+        ]
+        self.pool_stats: dict[str, int] = {
+            "checkouts": 0,
+        }
+        for engine in [self.engine, *self.replica_engines]:
+            event.listen(engine.sync_engine, 'checkout', self.count_checkout)
 
         # Store the decoded level data and checksum separately to reduce database usage
 
+    def read_session(self, primary: bool = False) -> async_sessionmaker[AsyncSession]:
+        # read-only sessions on a random replica, or on the primary if there is none
+        if primary or not self.replica_sessions:
+            return self.read_only_session
+        return random.choice(self.replica_sessions)
+
+    def count_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        self.pool_stats["checkouts"] += 1
+
     async def create_columns(self):
+        # creates missing tables, columns and indexes of existing tables are added by database.migrate
         async with self.engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
+
+    async def check_schema(self):
+        # refuse to serve a database that database.migrate has not upgraded yet
+        async with self.engine.connect() as conn:
+            missing: list[str] = await conn.run_sync(missing_schema)
+        if missing:
+            raise RuntimeError(
+                f"Database schema is outdated, missing {', '.join(missing)}. Run: python -m database.migrate"
+            )
+
+
+def missing_schema(conn) -> list[str]:
+    # columns of the models, and indexes with info={'required': True}, that the database does not have yet
+    inspector = inspect(conn)
+    missing: list[str] = []
+    for table in Base.metadata.sorted_tables:
+        existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+        missing += [f'{table.name}.{column.name}' for column in table.columns if column.name not in existing_columns]
+        existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        missing += [
+            f'index {index.name}' for index in table.indexes
+            if index.info.get('required') and index.name not in existing_indexes
+        ]
+    return missing
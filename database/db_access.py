@@ -1,28 +1,98 @@
-from sqlalchemy.ext.asyncio import AsyncSession
-from database.models import Level, LevelData, User, ClearedUsers, LikeUsers, DislikeUsers, Client
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from redis.asyncio import Redis
+from database.models import Level, LevelData, User, ClearedUsers, LikeUsers, DislikeUsers, Client, LevelNameGram
+from database.search import title_grams, title_query_grams
+from database.difficulty import difficulty_expression
 import datetime
-from sqlalchemy import func, select, delete
+import functools
+import random
+from sqlalchemy import func, select, insert, delete, exists, update, bindparam, literal, Integer, inspect
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy import or_, and_
-from config import RECORD_CLEAR_USERS
+from config import RECORD_CLEAR_USERS, DATABASE_REPLICAS
+from database.replica import mark_sticky
+from cache.level import level_cache, LEVEL_CACHE_CHANNEL
+from cache.user_name import (
+    user_name_cache, get_cached_user_names, set_cached_user_names, USER_NAME_CACHE_CHANNEL, UNKNOWN_USER
+)
+from cache.pubsub import publish_invalidation
+
+
+# Columns returned by the atomic counter updates
+COUNTER_RETURNING: tuple[str, ...] = (
+    'id', 'level_id', 'name', 'author_id', 'plays', 'deaths', 'clears', 'likes', 'dislikes', 'record', 'record_user_id'
+)
+
+
+def group_committed(method):
+    # with a group commit writer (SQLite), run the write in the writer's shared transaction
+    # the write is committed when this returns, not by the caller's commit()
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        if self.writer is None:
+            return await method(self, *args, **kwargs)
+        result = await self.writer.submit(lambda dal: method(dal, *args, **kwargs))
+        # committed without this DAL's session, so commit() would not see the write
+        await self.stick_to_primary()
+        return result
+    return wrapper
 
 
 class DBAccessLayer:
-    def __init__(self, session: AsyncSession):
-        self.session = session
+    def __init__(self, session: AsyncSession | None = None, redis: Redis | None = None,
+                 session_maker: async_sessionmaker[AsyncSession] | None = None, read_only: bool = False,
+                 user_id: int | None = None, writer=None, replica: bool = False):
+        # either an open session, or a session maker to open one on first use
+        self._session = session
+        self.session_maker = session_maker
+        self.redis = redis
+        self.read_only = read_only
+        # reads from a replica, whose rows may lag behind the primary and are never cached
+        self.replica = replica
+        # user of the request, whose reads stay on the primary after this DAL commits
+        self.user_id = user_id
+        # GroupCommitWriter for the level stats writes, see group_committed
+        self.writer = writer
+        self.committed: bool = False
+        # level ids written in this session, published to other workers on commit
+        self.stale_levels: set[str] = set()
+        # usernames added or changed in this session, cached and published on commit
+        self.changed_user_names: dict[int, str] = {}
+
+    @property
+    def session(self) -> AsyncSession:
+        # no session (and no pool checkout) for requests that never query
+        if self._session is None:
+            self._session = self.session_maker()
+        return self._session
+
+    def invalidate_level(self, level_id: str):
+        self.stale_levels.add(level_id)
+        level_cache.invalidate([level_id])
 
     async def add_level(self, name: str, style: int, environment: int, tag_1: int, tag_2: int, author_id: int,
-                        level_id: str, non_latin: bool, testing_client: bool, description: str):
+                        level_id: str, non_latin: bool, testing_client: bool, description: str,
+                        latin_name: str | None = None):
         # add level metadata into database
         level = Level(name=name, likes=0, dislikes=0, plays=0, deaths=0, clears=0,
                       style=style, environment=environment, tag_1=tag_1, tag_2=tag_2,
                       date=datetime.date.today(), author_id=author_id,
-                      level_id=level_id, non_latin=non_latin, record_user_id=0, record=0,
-                      testing_client=testing_client, featured=False, description=description)
+                      level_id=level_id, non_latin=non_latin, latin_name=latin_name, record_user_id=0, record=0,
+                      testing_client=testing_client, featured=False, description=description,
+                      difficulty=None, score=0)
         self.session.add(level)
         await self.session.flush()
+        # add level name into title search index
+        self.session.add_all([
+            LevelNameGram(parent_id=level.id, gram=gram) for gram in title_grams(name)
+        ])
+        await self.session.flush()
         return level
 
     async def update_user(self, user: User):
+        if inspect(user).attrs.username.history.has_changes():
+            self.changed_user_names[user.id] = user.username
         self.session.add(user)
         await self.session.flush()
 
@@ -33,6 +103,7 @@ class DBAccessLayer:
 
         self.session.add(user)
         await self.session.flush()
+        self.changed_user_names[user.id] = username
 
     async def execute_selection(self, selection) -> list:
         return (await self.session.execute(
@@ -56,51 +127,176 @@ class DBAccessLayer:
         else:
             return '3'  # none
 
-    async def add_like_to_level(self, user_id: int, level: Level):
-        # add like to level
-        like = LikeUsers(parent_id=level.id, user_id=user_id)
-        level.likes += 1
-        self.session.add_all([like, level])
-        await self.session.flush()
-
-    async def add_dislike_to_level(self, user_id: int, level: Level):
-        # add dislike to level
-        dislike = DislikeUsers(parent_id=level.id, user_id=user_id)
-        level.dislikes += 1
-        self.session.add_all([dislike, level])
-        await self.session.flush()
-
-    async def add_play_to_level(self, level: Level):
+    def insert_ignore(self, model, selection):
+        # INSERT ... SELECT of (parent_id, user_id) that skips rows violating a unique index
+        match self.session.get_bind().dialect.name:
+            case 'postgresql':
+                return postgresql_insert(model).from_select(['parent_id', 'user_id'], selection).on_conflict_do_nothing()
+            case 'sqlite':
+                return sqlite_insert(model).from_select(['parent_id', 'user_id'], selection).on_conflict_do_nothing()
+            case _:
+                return insert(model).from_select(['parent_id', 'user_id'], selection).prefix_with('IGNORE')
+
+    async def set_like_type(self, user_id: int, level_condition, like: bool) -> tuple[int, int]:
+        # like or dislike a level and drop user's opposite vote, without touching the level's counters
+        # level_condition selects the level, e.g. Level.level_id == level_id
+        # returns the changes of (likes, dislikes), (0, 0) for a repeated vote
+        vote, opposite = (LikeUsers, DislikeUsers) if like else (DislikeUsers, LikeUsers)
+        removed: int = (await self.session.execute(
+            delete(opposite).where(
+                opposite.parent_id.in_(select(Level.id).where(level_condition)),
+                opposite.user_id == user_id
+            )
+        )).rowcount
+        added: int = (await self.session.execute(
+            self.insert_ignore(vote, select(Level.id, literal(user_id, Integer)).where(level_condition))
+        )).rowcount
+        return (added, -removed) if like else (-removed, added)
+
+    @group_committed
+    async def add_like_user(self, user_id: int, level: Level) -> tuple[int, int]:
+        # record user's like of a level, without touching the level's counters
+        return await self.set_like_type(user_id, Level.id == level.id, like=True)
+
+    @group_committed
+    async def add_dislike_user(self, user_id: int, level: Level) -> tuple[int, int]:
+        # record user's dislike of a level, without touching the level's counters
+        return await self.set_like_type(user_id, Level.id == level.id, like=False)
+
+    async def increment_level_counters(self, level_id: str, increments: dict[str, int]):
+        # atomically add to counters of a level with a single UPDATE ... RETURNING
+        # returns the updated row (see COUNTER_RETURNING), or None if the level does not exist
+        columns = Level.__table__.c
+        returning = [columns[name] for name in COUNTER_RETURNING]
+        increments = {field: amount for field, amount in increments.items() if amount != 0}
+        if not increments:
+            return (await self.session.execute(
+                select(*returning).where(columns.level_id == level_id)
+            )).first()
+        values = []
+        if 'plays' in increments or 'clears' in increments:
+            # MySQL evaluates SET left to right with updated values, so difficulty goes first
+            values.append((columns.difficulty, difficulty_expression(
+                columns.plays + increments.get('plays', 0),
+                columns.clears + increments.get('clears', 0)
+            )))
+        if 'likes' in increments or 'dislikes' in increments:
+            # score reads likes and dislikes, so it goes before them too
+            values.append((columns.score, func.coalesce(columns.score, columns.likes - columns.dislikes)
+                           + increments.get('likes', 0) - increments.get('dislikes', 0)))
+        for field, amount in increments.items():
+            values.append((columns[field], columns[field] + amount))
+        self.invalidate_level(level_id)
+        statement = update(Level.__table__).where(columns.level_id == level_id).ordered_values(*values)
+        if self.session.get_bind().dialect.update_returning:
+            return (await self.session.execute(statement.returning(*returning))).first()
+        else:
+            # emulated on MySQL, the updated row stays locked by this transaction until commit
+            await self.session.execute(statement)
+            return (await self.session.execute(
+                select(*returning).where(columns.level_id == level_id)
+            )).first()
+
+    @group_committed
+    async def add_like_to_level(self, user_id: int, level_id: str):
+        # add like to level, in one transaction with dropping user's dislike
+        # returns (updated row or None, whether the like is new)
+        likes, dislikes = await self.set_like_type(user_id, Level.level_id == level_id, like=True)
+        level = await self.increment_level_counters(level_id, {'likes': likes, 'dislikes': dislikes})
+        return level, likes > 0
+
+    @group_committed
+    async def add_dislike_to_level(self, user_id: int, level_id: str):
+        # add dislike to level, in one transaction with dropping user's like
+        # returns (updated row or None, whether the dislike is new)
+        likes, dislikes = await self.set_like_type(user_id, Level.level_id == level_id, like=False)
+        level = await self.increment_level_counters(level_id, {'likes': likes, 'dislikes': dislikes})
+        return level, dislikes > 0
+
+    @group_committed
+    async def add_play_to_level(self, level_id: str):
         # add play to level
-        level.plays += 1
-        self.session.add(level)
-        await self.session.flush()
+        return await self.increment_level_counters(level_id, {'plays': 1})
 
-    async def add_death_to_level(self, level: Level):
+    @group_committed
+    async def add_death_to_level(self, level_id: str):
         # add death to level
-        level.deaths += 1
-        self.session.add(level)
-        await self.session.flush()
+        return await self.increment_level_counters(level_id, {'deaths': 1})
 
-    async def add_clear_to_level(self, user_id: int, level: Level):
-        # add clear to level
+    @group_committed
+    async def add_cleared_user(self, user_id: int, level: Level):
+        # record user's clear of a level, without touching the level's counters
+        # the unique index of clears_table drops repeated clears, also when two of them race
         if RECORD_CLEAR_USERS:
-            if (await self.session.execute(
-                    select(ClearedUsers).where(and_(ClearedUsers.parent_id == level.id,
-                                               ClearedUsers.user_id == user_id))
-            )).scalars().first() is None:
-                clear = ClearedUsers(parent_id=level.id, user_id=user_id)
-                self.session.add(clear)
-        level.clears += 1
-        self.session.add(level)
-        await self.session.flush()
+            await self.session.execute(self.insert_ignore(
+                ClearedUsers, select(Level.id, literal(user_id, Integer)).where(Level.id == level.id)
+            ))
+
+    @group_committed
+    async def add_clear_to_level(self, user_id: int, level_id: str, record: int, count: bool = True):
+        # add clear to level, in one transaction with recording the cleared user and the record
+        # with count=False the clears counter is left to the counter buffer
+        # returns the level as it was before the record, or None if it does not exist
+        if count:
+            level = await self.increment_level_counters(level_id, {'clears': 1})
+        else:
+            level = await self.get_level_by_level_id(level_id)
+        if level is None:
+            return None
+        await self.add_cleared_user(user_id=user_id, level=level)
+        if level.record == 0 or level.record > record:
+            await self.update_record_to_level(user_id=user_id, level=level, record=record)
+        return level
 
-    async def update_record_to_level(self, user_id: int, level: Level, record: int):
-        # update record to level
-        level.record_user_id = user_id
-        level.record = record
-        self.session.add(level)
-        await self.session.flush()
+    async def apply_counter_increments(self, increments: list[dict[str, int]]):
+        # add buffered counter increments to levels in one batched UPDATE
+        # each item has the level data id as "id" and the increments of
+        # plays, deaths, clears, likes and dislikes
+        level_table = Level.__table__
+        columns = level_table.c
+        plays = bindparam('b_plays', type_=Integer)
+        clears = bindparam('b_clears', type_=Integer)
+        likes = bindparam('b_likes', type_=Integer)
+        dislikes = bindparam('b_dislikes', type_=Integer)
+        await self.session.execute(
+            update(level_table).where(
+                columns.id == bindparam('b_id')
+            ).ordered_values(
+                # MySQL evaluates SET left to right with updated values, so difficulty and score go first
+                (columns.difficulty, difficulty_expression(columns.plays + plays, columns.clears + clears)),
+                (columns.score, func.coalesce(columns.score, columns.likes - columns.dislikes) + likes - dislikes),
+                (columns.plays, columns.plays + plays),
+                (columns.deaths, columns.deaths + bindparam('b_deaths', type_=Integer)),
+                (columns.clears, columns.clears + clears),
+                (columns.likes, columns.likes + likes),
+                (columns.dislikes, columns.dislikes + dislikes),
+            ),
+            [
+                {
+                    'b_id': item['id'],
+                    'b_plays': item.get('plays', 0),
+                    'b_deaths': item.get('deaths', 0),
+                    'b_clears': item.get('clears', 0),
+                    'b_likes': item.get('likes', 0),
+                    'b_dislikes': item.get('dislikes', 0),
+                } for item in increments
+            ]
+        )
+        for level_id in (await self.session.execute(
+                select(columns.level_id).where(columns.id.in_([item['id'] for item in increments]))
+        )).scalars().all():
+            self.invalidate_level(level_id)
+
+    @group_committed
+    async def update_record_to_level(self, user_id: int, level, record: int):
+        # update record to level if it beats the current one
+        self.invalidate_level(level.level_id)
+        await self.session.execute(
+            update(Level).where(
+                Level.id == level.id,
+                or_(Level.record == 0, Level.record > record)
+            ).values(record_user_id=user_id, record=record)
+        )
 
     async def get_user_by_username(self, username: str) -> User | None:
         # get user from username
@@ -116,6 +312,37 @@ class DBAccessLayer:
         )).scalars().first()
         return user if (user is not None) else None
 
+    async def get_user_names_by_ids(self, user_ids) -> dict[int, str]:
+        # get usernames of several users through the user name caches, missing users are left out
+        user_ids = set(user_ids)
+        if not user_ids:
+            return {}
+        version = user_name_cache.version
+        user_names: dict[int, str] = user_name_cache.get_many(user_ids)
+        missing_user_ids = user_ids - user_names.keys()
+        if missing_user_ids and self.redis is not None:
+            found_user_names = await get_cached_user_names(self.redis, list(missing_user_ids))
+            user_name_cache.set_many(found_user_names, version)
+            user_names |= found_user_names
+            missing_user_ids -= found_user_names.keys()
+        if missing_user_ids:
+            # users not found are cached as unknown too
+            found_user_names = dict.fromkeys(missing_user_ids, UNKNOWN_USER) | {
+                user_id: username for user_id, username in (await self.session.execute(
+                    select(User.id, User.username).where(User.id.in_(missing_user_ids))
+                )).all()
+            }
+            if not self.replica:
+                user_name_cache.set_many(found_user_names, version)
+                if self.redis is not None:
+                    await set_cached_user_names(self.redis, found_user_names)
+            user_names |= found_user_names
+        return {user_id: username for user_id, username in user_names.items() if username != UNKNOWN_USER}
+
+    async def get_user_name_by_id(self, user_id: int) -> str | None:
+        # get username of a user through the user name caches
+        return (await self.get_user_names_by_ids([user_id])).get(user_id)
+
     async def get_user_by_im_id(self, im_id: int) -> User | None:
         # get user from IM user id
         user = (await self.session.execute(
@@ -124,11 +351,66 @@ class DBAccessLayer:
         return user if (user is not None) else None
 
     async def get_level_by_level_id(self, level_id: str) -> Level | None:
-        # get level from level id
+        # get level from level id, through the level cache of this worker
+        cached_level = level_cache.get(level_id)
+        if cached_level is not None:
+            return await self.session.merge(cached_level, load=False)
+        version = level_cache.version
+        # counters are updated with plain UPDATEs, so refresh levels already in this session
         level = (await self.session.execute(
-            select(Level).where(Level.level_id == level_id)
+            select(Level).where(Level.level_id == level_id).execution_options(populate_existing=True)
+        )).scalars().first()
+        if level is not None and not self.replica and level_id not in self.stale_levels:
+            # levels written in this session may not be committed yet
+            level_cache.set(level, version)
+        return level
+
+    async def get_level_by_id(self, level_data_id: int) -> Level | None:
+        # get level from level data id
+        return (await self.session.execute(
+            select(Level).where(Level.id == level_data_id)
+        )).scalars().first()
+
+    def random_level_conditions(self, difficulty: int | None, include_testing: bool) -> list:
+        conditions = []
+        if difficulty is not None:
+            conditions.append(Level.difficulty == difficulty)
+        if not include_testing:
+            conditions.append(Level.testing_client == False)
+        return conditions
+
+    async def get_random_level_ids(self, difficulty: int | None, include_testing: bool,
+                                   count: int, blocks: int) -> list[int]:
+        # sample up to count data ids of levels matching random level filters,
+        # as blocks of consecutive matching ids from random starting points
+        conditions = self.random_level_conditions(difficulty, include_testing)
+        min_id, max_id = (await self.session.execute(
+            select(func.min(Level.id), func.max(Level.id)).where(*conditions)
+        )).one()
+        if min_id is None:
+            return []
+        level_ids: set[int] = set()
+        for _ in range(blocks):
+            level_ids.update((await self.session.execute(
+                select(Level.id).where(
+                    *conditions, Level.id >= random.randint(min_id, max_id)
+                ).order_by(Level.id.asc()).limit(-(-count // blocks))
+            )).scalars().all())
+        return list(level_ids)
+
+    async def get_random_level(self, difficulty: int | None, include_testing: bool) -> Level | None:
+        # sample a random level by data id range, used when the random level pool is empty
+        conditions = self.random_level_conditions(difficulty, include_testing)
+        min_id, max_id = (await self.session.execute(
+            select(func.min(Level.id), func.max(Level.id)).where(*conditions)
+        )).one()
+        if min_id is None:
+            return None
+        return (await self.session.execute(
+            select(Level).where(
+                *conditions, Level.id >= random.randint(min_id, max_id)
+            ).order_by(Level.id.asc()).limit(1)
         )).scalars().first()
-        return level if (level is not None) else None
 
     async def get_clear_type(self, level: Level, user_id: int) -> str:
         # get user's clear type (yes or no) of a level
@@ -144,6 +426,72 @@ class DBAccessLayer:
         else:
             return 'no'
 
+    async def get_user_data_by_levels(self, level_ids, user_id: int) -> dict[int, tuple[str, str]]:
+        # get user's like type and clear type of several levels at once
+        # returns {level.id: (like type, clear type)}, same values as get_like_type and get_clear_type
+        level_ids = set(level_ids)
+        if not level_ids:
+            return {}
+        liked: set[int] = set((await self.session.execute(
+            select(LikeUsers.parent_id).where(and_(LikeUsers.parent_id.in_(level_ids),
+                                                   LikeUsers.user_id == user_id))
+        )).scalars().all())
+        disliked: set[int] = set((await self.session.execute(
+            select(DislikeUsers.parent_id).where(and_(DislikeUsers.parent_id.in_(level_ids),
+                                                      DislikeUsers.user_id == user_id))
+        )).scalars().all())
+        if RECORD_CLEAR_USERS:
+            cleared: set[int] = set((await self.session.execute(
+                select(ClearedUsers.parent_id).where(and_(ClearedUsers.parent_id.in_(level_ids),
+                                                          ClearedUsers.user_id == user_id))
+            )).scalars().all())
+        else:
+            cleared: set[int] = set()
+        user_data: dict[int, tuple[str, str]] = {}
+        for level_id in level_ids:
+            if level_id in liked:
+                like_type = '0'  # like
+            elif level_id in disliked:
+                like_type = '1'  # dislike
+            else:
+                like_type = '3'  # none
+            user_data[level_id] = (like_type, 'yes' if level_id in cleared else 'no')
+        return user_data
+
+    def title_contains(self, title: str):
+        # filter of levels whose name contains title
+        # candidates come from the title search index, LIKE only rechecks them to keep its semantics
+        # % and _ in titles are literal characters
+        contains = Level.name.contains(title, autoescape=True)
+        grams: set[str] = title_query_grams(title)
+        if not grams:
+            # too short for the index
+            return contains
+        return and_(
+            Level.id.in_(
+                select(LevelNameGram.parent_id).where(
+                    LevelNameGram.gram.in_(grams)
+                ).group_by(LevelNameGram.parent_id).having(func.count() == len(grams))
+            ),
+            contains
+        )
+
+    def liked_by_user(self, user_id: int):
+        # filter of levels liked by user, as a correlated EXISTS subquery
+        return exists().where(and_(LikeUsers.parent_id == Level.id,
+                                   LikeUsers.user_id == user_id))
+
+    def disliked_by_user(self, user_id: int):
+        # filter of levels disliked by user, as a correlated EXISTS subquery
+        return exists().where(and_(DislikeUsers.parent_id == Level.id,
+                                   DislikeUsers.user_id == user_id))
+
+    def cleared_by_user(self, user_id: int):
+        # filter of levels cleared by user, as a correlated EXISTS subquery
+        # negate it with ~ for an anti-join
+        return exists().where(and_(ClearedUsers.parent_id == Level.id,
+                                   ClearedUsers.user_id == user_id))
+
     async def get_liked_levels_by_user(self, user_id: int) -> list[LikeUsers]:
         # get user's liked levels
         return (
@@ -190,6 +538,7 @@ class DBAccessLayer:
             return None
 
     async def delete_level(self, level: Level):
+        self.invalidate_level(level.level_id)
         await self.session.delete(level)
         await self.session.execute(
             delete(LikeUsers).where(LikeUsers.parent_id == level.id)
@@ -197,6 +546,9 @@ class DBAccessLayer:
         await self.session.execute(
             delete(DislikeUsers).where(DislikeUsers.parent_id == level.id)
         )
+        await self.session.execute(
+            delete(LevelNameGram).where(LevelNameGram.parent_id == level.id)
+        )
         await self.session.flush()
 
     async def delete_level_data(self, level_id: str):
@@ -206,6 +558,7 @@ class DBAccessLayer:
         await self.session.flush()
 
     async def set_featured(self, level: Level, is_featured: bool):
+        self.invalidate_level(level.level_id)
         level.featured = is_featured
         self.session.add(level)
         await self.session.flush()
@@ -215,7 +568,7 @@ class DBAccessLayer:
             selection = select(Level)
         return (
             await self.session.execute(
-                select(func.count()).select_from(selection)
+                select(func.count()).select_from(selection.subquery())
             )
         ).scalars().first()
 
@@ -247,7 +600,7 @@ class DBAccessLayer:
         )
         self.session.add(client)
         await self.session.flush()
-
+        return client
 
     async def revoke_client(self, client: Client):
         client.valid = False
@@ -259,4 +612,35 @@ class DBAccessLayer:
         await self.session.flush()
 
     async def commit(self):
+        if self._session is None:
+            return
         await self.session.commit()
+        self.committed = True
+        await self.stick_to_primary()
+        if self.stale_levels:
+            # other requests may have cached the old rows until now, so invalidate again
+            level_cache.invalidate(self.stale_levels)
+            if self.redis is not None:
+                await publish_invalidation(self.redis, LEVEL_CACHE_CHANNEL, list(self.stale_levels))
+            self.stale_levels.clear()
+        if self.changed_user_names:
+            user_name_cache.invalidate(self.changed_user_names.keys())
+            if self.redis is not None:
+                await set_cached_user_names(self.redis, self.changed_user_names)
+                await publish_invalidation(self.redis, USER_NAME_CACHE_CHANNEL, list(self.changed_user_names))
+            self.changed_user_names.clear()
+
+    async def stick_to_primary(self):
+        # the user's next reads go to the primary until replicas caught up with this write
+        if DATABASE_REPLICAS and self.user_id is not None and self.redis is not None:
+            await mark_sticky(self.redis, self.user_id)
+
+    async def finish(self):
+        # commit if the handler did not, like the session.begin() block this replaces
+        if not self.committed and not self.read_only and self._session is not None \
+                and self._session.in_transaction():
+            await self.commit()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
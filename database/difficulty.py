@@ -0,0 +1,35 @@
+# Difficulty buckets of levels, by clear rate (clears / plays)
+# 0: Easy, 1: Normal, 2: Hard, 3: Expert
+# Stored in Level.difficulty, None when the level has not been played yet.
+# Filled in when the column is added (see database.migrate.backfill_columns).
+# After changing the thresholds, run: python -m database.jobs recompute-difficulty
+
+from sqlalchemy import case, null
+
+DIFFICULTY_THRESHOLDS: tuple[float, ...] = (0.2, 0.08, 0.01, 0.0)  # Lowest clear rate of each bucket
+MAX_CLEAR_RATE: float = 10.0  # Higher clear rates are bogus and get no bucket
+
+
+def difficulty_bucket(plays: int, clears: int) -> int | None:
+    if plays == 0:
+        return None
+    clear_rate: float = clears / plays
+    if clear_rate > MAX_CLEAR_RATE:
+        return None
+    for bucket, threshold in enumerate(DIFFICULTY_THRESHOLDS):
+        if clear_rate >= threshold:
+            return bucket
+    return None
+
+
+def difficulty_expression(plays, clears):
+    # SQL version of difficulty_bucket, for updates that change plays or clears in the database
+    clear_rate = clears / plays
+    return case(
+        (plays == 0, null()),
+        (clear_rate > MAX_CLEAR_RATE, null()),
+        *[
+            (clear_rate >= threshold, bucket) for bucket, threshold in enumerate(DIFFICULTY_THRESHOLDS)
+        ],
+        else_=null()
+    )
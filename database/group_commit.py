@@ -0,0 +1,115 @@
+import asyncio
+from typing import Any, Awaitable, Callable
+
+from loguru import logger
+from redis.asyncio import Redis
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+from config import DATABASE_HOST, DATABASE_PORT
+from database.db import create_engine
+from database.db_access import DBAccessLayer
+
+MAX_BATCH_SIZE: int = 256  # writes committed in one transaction at most
+
+
+class GroupCommitWriter:
+    # Single writer of SQLite level stats
+    # Handlers submit writes, which one task runs in a shared transaction, collected for window seconds under load,
+    # each in its own savepoint, instead of every request taking the database lock for itself.
+    def __init__(self, redis: Redis | None, window: float, engine: AsyncEngine | None = None):
+        # engine is the writer's own, by default connected to the configured database
+        self.redis = redis
+        self.window = window
+        self.queue: asyncio.Queue[
+            tuple[Callable[[DBAccessLayer], Awaitable[Any]], asyncio.Future] | None
+        ] = asyncio.Queue()
+        # the writer's own connection, taking the write lock at BEGIN so its savepoints never wait on a lock upgrade
+        self.engine = engine if engine is not None else create_engine(DATABASE_HOST, DATABASE_PORT)
+        event.listen(self.engine.sync_engine, 'connect', disable_driver_transactions)
+        event.listen(self.engine.sync_engine, 'begin', begin_immediate)
+        self.session_maker: async_sessionmaker[AsyncSession] = async_sessionmaker(
+            self.engine,
+            expire_on_commit=False
+        )
+        self.stats: dict[str, int] = {
+            "writes": 0,
+            "commits": 0,
+        }
+        self.task: asyncio.Task | None = None
+        self.closed: bool = False
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def close(self):
+        # called at shutdown, writes everything submitted so far and releases the writer's connection
+        self.closed = True
+        await self.queue.put(None)
+        await self.task
+        await self.engine.dispose()
+
+    async def submit(self, operation: Callable[[DBAccessLayer], Awaitable[Any]]) -> Any:
+        # returns the result of operation once its transaction is committed
+        if self.closed:
+            raise RuntimeError("Group commit writer is closed")
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        await self.queue.put((operation, future))
+        return await future
+
+    async def write(self, batch: list[tuple[Callable[[DBAccessLayer], Awaitable[Any]], asyncio.Future]]):
+        results: list[tuple[asyncio.Future, Any, Exception | None]] = []
+        try:
+            async with self.session_maker() as session:
+                dal = DBAccessLayer(session, self.redis)
+                for operation, future in batch:
+                    try:
+                        async with session.begin_nested():
+                            results.append((future, await operation(dal), None))
+                    except Exception as e:
+                        # only this write is rolled back
+                        results.append((future, None, e))
+                await dal.commit()
+        except Exception as e:
+            logger.error(f"Failed to commit {len(batch)} writes: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.stats["writes"] += len(batch)
+        self.stats["commits"] += 1
+        for future, result, error in results:
+            if future.done():  # request cancelled meanwhile
+                continue
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    async def run(self):
+        # until the None that close() queues after the last write
+        closing: bool = False
+        while not closing:
+            write = await self.queue.get()
+            if write is None:
+                return
+            batch = [write]
+            if not self.queue.empty():
+                # others are writing too, wait for more of them, a lone write is committed right away
+                await asyncio.sleep(self.window)
+            while not self.queue.empty() and len(batch) < MAX_BATCH_SIZE:
+                write = self.queue.get_nowait()
+                if write is None:
+                    closing = True
+                    break
+                batch.append(write)
+            await self.write(batch)
+
+
+def disable_driver_transactions(dbapi_connection, connection_record):
+    # let SQLAlchemy emit BEGIN, so that SAVEPOINT works with pysqlite
+    dbapi_connection.isolation_level = None
+
+
+def begin_immediate(conn):
+    conn.exec_driver_sql('BEGIN IMMEDIATE')
@@ -0,0 +1,158 @@
+# Maintenance jobs, run from the server directory:
+#   python -m database.jobs <job>
+import argparse
+import asyncio
+
+import numpy as np
+from loguru import logger
+from sqlalchemy import select, delete, update, bindparam, func
+
+from database.db import Database
+from database.models import Level, LevelNameGram, LikeUsers, DislikeUsers, ClearedUsers
+from database.search import title_grams
+from database.difficulty import DIFFICULTY_THRESHOLDS, MAX_CLEAR_RATE
+from common import string_latinify
+
+CHUNK_SIZE: int = 1000  # Levels per transaction
+
+
+async def reindex_titles(db: Database):
+    # rebuild the title search index of all levels, e.g. after a change of database.search.normalize_title
+    last_id: int = 0
+    while True:
+        async with db.async_session() as session:
+            async with session.begin():
+                rows = (await session.execute(
+                    select(Level.id, Level.name).where(Level.id > last_id).order_by(Level.id).limit(CHUNK_SIZE)
+                )).all()
+                if not rows:
+                    break
+                await session.execute(
+                    delete(LevelNameGram).where(LevelNameGram.parent_id.in_([row.id for row in rows]))
+                )
+                session.add_all([
+                    LevelNameGram(parent_id=row.id, gram=gram)
+                    for row in rows for gram in title_grams(row.name or '')
+                ])
+        last_id = rows[-1].id
+        logger.info(f"Reindexed level titles up to id {last_id}")
+
+
+def difficulty_buckets(plays: np.ndarray, clears: np.ndarray) -> np.ndarray:
+    # vectorized database.difficulty.difficulty_bucket, -1 stands for None
+    clear_rates = np.divide(clears, plays, out=np.zeros(len(plays)), where=(plays != 0))
+    bins = np.array(sorted(DIFFICULTY_THRESHOLDS))
+    buckets = len(DIFFICULTY_THRESHOLDS) - np.digitize(clear_rates, bins)
+    return np.where((plays == 0) | (clear_rates > MAX_CLEAR_RATE) | (clear_rates < bins[0]), -1, buckets)
+
+
+async def recompute_difficulty(db: Database):
+    # recompute difficulty buckets of all levels, e.g. after changing the thresholds
+    level_table = Level.__table__
+    update_difficulty = update(level_table).where(
+        level_table.c.id == bindparam('b_id')
+    ).values(difficulty=bindparam('b_difficulty'))
+    last_id: int = 0
+    updated: int = 0
+    while True:
+        async with db.async_session() as session:
+            async with session.begin():
+                rows = (await session.execute(
+                    select(Level.id, Level.plays, Level.clears, Level.difficulty).where(
+                        Level.id > last_id
+                    ).order_by(Level.id).limit(CHUNK_SIZE)
+                )).all()
+                if not rows:
+                    break
+                plays = np.array([row.plays or 0 for row in rows])
+                clears = np.array([row.clears or 0 for row in rows])
+                difficulties = np.array([-1 if row.difficulty is None else row.difficulty for row in rows])
+                buckets = difficulty_buckets(plays, clears)
+                changed = np.nonzero(buckets != difficulties)[0]
+                if len(changed) > 0:
+                    await session.execute(update_difficulty, [
+                        {
+                            'b_id': rows[i].id,
+                            'b_difficulty': None if buckets[i] == -1 else int(buckets[i])
+                        } for i in changed
+                    ])
+                updated += len(changed)
+        last_id = rows[-1].id
+        logger.info(f"Recomputed difficulty up to id {last_id}, {updated} levels updated")
+
+
+async def backfill_score(db: Database):
+    # recompute popularity scores from likes and dislikes, new columns are filled by database.migrate
+    async with db.async_session() as session:
+        async with session.begin():
+            await session.execute(
+                update(Level.__table__).values(score=Level.__table__.c.likes - Level.__table__.c.dislikes)
+            )
+    logger.info("Backfilled popularity scores")
+
+
+async def backfill_latin_names(db: Database):
+    # transliterate names of non-Latin levels created before Level.latin_name existed
+    level_table = Level.__table__
+    update_latin_name = update(level_table).where(
+        level_table.c.id == bindparam('b_id')
+    ).values(latin_name=bindparam('b_latin_name'))
+    last_id: int = 0
+    while True:
+        async with db.async_session() as session:
+            async with session.begin():
+                rows = (await session.execute(
+                    select(Level.id, Level.name).where(
+                        Level.id > last_id, Level.non_latin == True, Level.latin_name == None
+                    ).order_by(Level.id).limit(CHUNK_SIZE)
+                )).all()
+                if not rows:
+                    break
+                await session.execute(update_latin_name, [
+                    {'b_id': row.id, 'b_latin_name': string_latinify(row.name or '')} for row in rows
+                ])
+        last_id = rows[-1].id
+        logger.info(f"Backfilled latin names up to id {last_id}")
+
+
+async def dedupe_user_records(db: Database):
+    # drop repeated likes, dislikes and clears of the same user, which the unique indexes of
+    # likes_table, dislikes_table and clears_table reject, then recount likes, dislikes and scores
+    level_table = Level.__table__
+    async with db.async_session() as session:
+        async with session.begin():
+            for model in (LikeUsers, DislikeUsers, ClearedUsers):
+                # wrapped in a derived table, MySQL can not select from the table it deletes from
+                kept_ids = select(func.min(model.id).label('id')).group_by(model.parent_id, model.user_id).subquery()
+                result = await session.execute(
+                    delete(model).where(model.id.not_in(select(kept_ids.c.id)))
+                )
+                logger.info(f"Deleted {result.rowcount} repeated rows of {model.__tablename__}")
+            likes = select(func.count()).where(LikeUsers.parent_id == level_table.c.id).scalar_subquery()
+            dislikes = select(func.count()).where(DislikeUsers.parent_id == level_table.c.id).scalar_subquery()
+            await session.execute(
+                update(level_table).values(likes=likes, dislikes=dislikes, score=likes - dislikes)
+            )
+    logger.info("Recounted likes and dislikes")
+
+
+JOBS = {
+    'reindex-titles': reindex_titles,
+    'recompute-difficulty': recompute_difficulty,
+    'backfill-score': backfill_score,
+    'backfill-latin-names': backfill_latin_names,
+    'dedupe-user-records': dedupe_user_records,
+}
+
+
+async def main(job: str):
+    db = Database()
+    await db.create_columns()
+    await JOBS[job](db)
+    await db.engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Engine Tribe maintenance jobs')
+    parser.add_argument('job', choices=JOBS.keys())
+    asyncio.run(main(parser.parse_args().job))
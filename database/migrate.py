@@ -0,0 +1,200 @@
+# Schema migration of existing deployments, run from the server directory:
+#   python -m database.migrate
+# Run it before starting a new version, the server refuses to start while columns are missing.
+# Creates missing tables and columns, fills new columns and the title search index in chunks,
+# builds missing indexes online where the database supports it, rebuilding indexes a previous run
+# left invalid, and prints the query plans of the main queries before and after.
+# Every step only does what is left to do, so an interrupted run can be started again.
+import asyncio
+import re
+
+from loguru import logger
+from sqlalchemy import inspect, select, text, update, insert, exists, func
+from sqlalchemy.schema import CreateIndex
+
+from config import ROWS_PERPAGE
+from database.db import Database, Base
+from database.models import Level, LevelData, User, LikeUsers, ClearedUsers, Client, LevelNameGram
+from database.search import title_grams
+
+BACKFILL_CHUNK_SIZE: int = 10000  # Rows filled per transaction when a column is added
+TITLE_INDEX_CHUNK_SIZE: int = 1000  # Levels indexed per transaction when titles are indexed
+
+MAIN_QUERIES = {
+    'level by level id': select(Level).where(Level.level_id == '0000-0000-0000-0000'),
+    'levels by author': select(Level).where(Level.author_id == 1).order_by(Level.id.desc()).limit(ROWS_PERPAGE),
+    'popular levels': select(Level).where(Level.testing_client == False).order_by(
+        Level.score.desc(), Level.id.desc()
+    ).limit(ROWS_PERPAGE),
+    'levels by difficulty': select(Level.id).where(Level.difficulty == 0),
+    'user by username': select(User).where(User.username == 'username'),
+    'user by IM id': select(User).where(User.im_id == 1),
+    'client by token': select(Client).where(Client.token == 'token'),
+    'like state of a page': select(LikeUsers.parent_id).where(
+        LikeUsers.parent_id.in_([1, 2, 3]), LikeUsers.user_id == 1
+    ),
+    'clear state of a page': select(ClearedUsers.parent_id).where(
+        ClearedUsers.parent_id.in_([1, 2, 3]), ClearedUsers.user_id == 1
+    ),
+    'level data by level id': select(LevelData).where(LevelData.level_id == '0000-0000-0000-0000'),
+}
+
+def explain_main_queries(conn) -> dict[str, list[str]]:
+    explain: str = 'EXPLAIN QUERY PLAN' if conn.dialect.name == 'sqlite' else 'EXPLAIN'
+    plans: dict[str, list[str]] = {}
+    for name, query in MAIN_QUERIES.items():
+        compiled = query.compile(dialect=conn.dialect, compile_kwargs={'literal_binds': True})
+        try:
+            plans[name] = [
+                ' | '.join(str(value) for value in row) for row in conn.execute(text(f'{explain} {compiled}'))
+            ]
+        except Exception as e:
+            # before migration, e.g. a column the query uses does not exist yet
+            plans[name] = [f'failed: {e.__class__.__name__}: {e}'.splitlines()[0]]
+    return plans
+
+
+def add_missing_columns(conn):
+    # create_all only creates missing tables, so add the columns introduced since a table was created
+    # nullable and without default, so no database rewrites the table
+    inspector = inspect(conn)
+    preparer = conn.dialect.identifier_preparer
+    for table in Base.metadata.sorted_tables:
+        existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            logger.info(f"Adding column {table.name}.{column.name}")
+            ddl: str = f'ALTER TABLE {preparer.format_table(table)} ' \
+                       f'ADD COLUMN {preparer.format_column(column)} {column.type.compile(dialect=conn.dialect)}'
+            if conn.dialect.name == 'mysql':
+                ddl += ', ALGORITHM=INPLACE, LOCK=NONE'
+            conn.execute(text(ddl))
+
+
+async def backfill_columns(engine):
+    # fill columns with info={'backfill': ...} from the existing ones where they are still NULL,
+    # which also covers rows written meanwhile by servers that did not know the column
+    # the function gets table.c, each chunk of ids is committed on its own
+    for table in Base.metadata.sorted_tables:
+        columns = [column for column in table.columns if 'backfill' in column.info]
+        if not columns:
+            continue
+        async with engine.connect() as conn:
+            min_id, max_id = (await conn.execute(select(func.min(table.c.id), func.max(table.c.id)))).one()
+        if min_id is None:
+            continue
+        for column in columns:
+            filled: int = 0
+            for start in range(min_id, max_id + 1, BACKFILL_CHUNK_SIZE):
+                async with engine.begin() as conn:
+                    filled += (await conn.execute(
+                        update(table).where(
+                            table.c.id >= start, table.c.id < start + BACKFILL_CHUNK_SIZE, column.is_(None)
+                        ).values({column.name: column.info['backfill'](table.c)})
+                    )).rowcount
+            logger.info(f"Filled {filled} rows of {table.name}.{column.name}")
+
+
+async def index_missing_titles(engine):
+    # add levels without any n-gram to the title search index, e.g. all of them when the index was added
+    # levels with names too short for an n-gram are read again, but have nothing to add
+    level_table = Level.__table__
+    last_id: int = 0
+    indexed: int = 0
+    while True:
+        async with engine.begin() as conn:
+            rows = (await conn.execute(
+                select(level_table.c.id, level_table.c.name).where(
+                    level_table.c.id > last_id,
+                    ~exists().where(LevelNameGram.parent_id == level_table.c.id)
+                ).order_by(level_table.c.id).limit(TITLE_INDEX_CHUNK_SIZE)
+            )).all()
+            if not rows:
+                break
+            grams = [{'parent_id': row.id, 'gram': gram} for row in rows for gram in title_grams(row.name or '')]
+            if grams:
+                await conn.execute(insert(LevelNameGram), grams)
+        indexed += len(rows)
+        last_id = rows[-1].id
+    if indexed:
+        logger.info(f"Indexed titles of {indexed} levels")
+
+
+def create_index_online(conn, index):
+    ddl: str = str(CreateIndex(index).compile(dialect=conn.dialect))
+    match conn.dialect.name:
+        case 'postgresql':
+            # needs a connection in autocommit mode
+            ddl = re.sub(r'^CREATE (UNIQUE )?INDEX', r'CREATE \1INDEX CONCURRENTLY', ddl)
+        case 'mysql':
+            ddl += ' ALGORITHM=INPLACE LOCK=NONE'
+    conn.execute(text(ddl))
+
+
+def drop_invalid_indexes(conn):
+    # a failed CREATE INDEX CONCURRENTLY leaves an invalid index behind on PostgreSQL, which is never
+    # used by queries but still exists, so drop it for create_missing_indexes to build it again
+    if conn.dialect.name != 'postgresql':
+        return
+    index_names: set[str] = {index.name for table in Base.metadata.sorted_tables for index in table.indexes}
+    invalid_indexes: list[str] = conn.execute(text(
+        'SELECT c.relname FROM pg_index i '
+        'JOIN pg_class c ON c.oid = i.indexrelid '
+        'JOIN pg_namespace n ON n.oid = c.relnamespace '
+        'WHERE NOT i.indisvalid AND n.nspname = current_schema()'
+    )).scalars().all()
+    preparer = conn.dialect.identifier_preparer
+    for index_name in invalid_indexes:
+        if index_name not in index_names:
+            continue
+        logger.warning(f"Dropping invalid index {index_name} left by an interrupted build")
+        conn.execute(text(f'DROP INDEX CONCURRENTLY {preparer.quote(index_name)}'))
+
+
+def create_missing_indexes(conn):
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing_indexes:
+                continue
+            logger.info(f"Creating index {index.name}")
+            try:
+                create_index_online(conn, index)
+            except Exception as e:
+                # e.g. duplicated rows violating a unique index, run the dedupe-user-records job and run again
+                logger.error(f"Failed to create index {index.name}: {e}")
+
+
+def print_plans(title: str, plans: dict[str, list[str]]):
+    print(f'==== {title} ====')
+    for name, plan in plans.items():
+        print(f'-- {name}')
+        for line in plan:
+            print(f'   {line}')
+
+
+async def main():
+    db = Database()
+    async with db.engine.connect() as conn:
+        await conn.execution_options(isolation_level='AUTOCOMMIT')
+        before: dict[str, list[str]] = await conn.run_sync(explain_main_queries)
+    await db.create_columns()
+    async with db.engine.connect() as conn:
+        await conn.execution_options(isolation_level='AUTOCOMMIT')
+        await conn.run_sync(add_missing_columns)
+    await backfill_columns(db.engine)
+    await index_missing_titles(db.engine)
+    async with db.engine.connect() as conn:
+        await conn.execution_options(isolation_level='AUTOCOMMIT')
+        await conn.run_sync(drop_invalid_indexes)
+        await conn.run_sync(create_missing_indexes)
+        after: dict[str, list[str]] = await conn.run_sync(explain_main_queries)
+    print_plans('Query plans before migration', before)
+    print_plans('Query plans after migration', after)
+    await db.engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
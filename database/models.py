@@ -1,9 +1,17 @@
 from database.db import Base
 from sqlalchemy import Column, Integer, UnicodeText, Text, Date, Boolean, LargeBinary, String, BigInteger, SmallInteger
+from sqlalchemy import Index
+from database.difficulty import difficulty_expression
 
 
 class Level(Base):
-    __table_args = {'mysql_charset': 'utf8mb4'}
+    __table_args__ = (
+        # latest and oldest listings, ordered by id within a client type
+        Index('ix_level_table_testing_client_id', 'testing_client', 'id'),
+        # popular listings, ordered by (score, id) within a client type
+        Index('ix_level_table_testing_client_score', 'testing_client', 'score', 'id'),
+        {'mysql_charset': 'utf8mb4'}
+    )
     __mapper_args__ = {"eager_defaults": True}
     __tablename__ = "level_table"
 
@@ -21,16 +29,27 @@ class Level(Base):
     tag_2 = Column(SmallInteger)  # Tag 2
     description = Column(UnicodeText)  # Level description
     date = Column(Date)  # Upload date
-    author_id = Column(Integer)  # Level maker's ID
-    level_id = Column(String(19))  # Level ID
+    author_id = Column(Integer, index=True)  # Level maker's ID
+    level_id = Column(String(19), index=True, unique=True)  # Level ID
     non_latin = Column(Boolean)  # Whether the level name contains non-Latin characters
+    latin_name = Column(UnicodeText)  # Transliterated name for mobile clients, non-Latin levels only
     featured = Column(Boolean)  # Whether the level is in promising levels
     record_user_id = Column(Integer)  # Record user's ID
     record = Column(BigInteger)  # Record (ticks)
     testing_client = Column(Boolean)  # For 3.3.0+ testing client
+    difficulty = Column(SmallInteger, index=True, info={
+        'backfill': lambda columns: difficulty_expression(columns.plays, columns.clears)
+    })  # Difficulty bucket, see database/difficulty.py
+    score = Column(Integer, info={
+        'backfill': lambda columns: columns.likes - columns.dislikes
+    })  # Popularity score (likes - dislikes)
 
 
 class LikeUsers(Base):
+    __table_args__ = (
+        # DBAccessLayer.insert_ignore relies on it, the server does not start without it
+        Index('uq_likes_table_parent_id_user_id', 'parent_id', 'user_id', unique=True, info={'required': True}),
+    )
     __tablename__ = "likes_table"
 
     id = Column(Integer, primary_key=True)
@@ -40,6 +59,10 @@ class LikeUsers(Base):
 
 
 class DislikeUsers(Base):
+    __table_args__ = (
+        # DBAccessLayer.insert_ignore relies on it, the server does not start without it
+        Index('uq_dislikes_table_parent_id_user_id', 'parent_id', 'user_id', unique=True, info={'required': True}),
+    )
     __tablename__ = "dislikes_table"
 
     id = Column(Integer, primary_key=True)
@@ -49,6 +72,10 @@ class DislikeUsers(Base):
 
 
 class ClearedUsers(Base):
+    __table_args__ = (
+        # DBAccessLayer.insert_ignore relies on it, the server does not start without it
+        Index('uq_clears_table_parent_id_user_id', 'parent_id', 'user_id', unique=True, info={'required': True}),
+    )
     __tablename__ = "clears_table"
 
     id = Column(Integer, primary_key=True)
@@ -62,8 +89,8 @@ class User(Base):
 
     id = Column(Integer, primary_key=True)
 
-    username = Column(String(30))  # User name
-    im_id = Column(BigInteger)  # User ID (QQ / Telegram)
+    username = Column(String(30), index=True, unique=True)  # User name
+    im_id = Column(BigInteger, index=True, unique=True)  # User ID (QQ / Telegram)
     uploads = Column(Integer)  # Upload levels count
     password_hash = Column(String(64))  # Password SHA256 hash
     is_admin = Column(Boolean)  # Is administrator
@@ -78,7 +105,7 @@ class LevelData(Base):  # used in StorageProviderDatabase
 
     id = Column(Integer, primary_key=True)
 
-    level_id = Column(String(19))  # Level id
+    level_id = Column(String(19), index=True)  # Level id
     level_data = Column(LargeBinary)  # Leve data without checksum
     level_checksum = Column(String(40))  # SHA-1 HMAC checksum
 
@@ -88,9 +115,24 @@ class Client(Base):  # Client tokens
 
     id = Column(Integer, primary_key=True)
 
-    token = Column(String(9))  # Client
+    token = Column(String(9), index=True, unique=True)  # Client
     valid = Column(Boolean)  # Whether the token is valid
     type = Column(SmallInteger)  # Client types
     locale = Column(String(2))  # Locale
     mobile = Column(Boolean)  # Is mobile client
     proxied = Column(Boolean)  # Whether to proxy level data
+
+
+class LevelNameGram(Base):  # Title search index, see database/search.py
+    __table_args__ = (
+        # covers the lookup of levels by n-gram, without reading the rows
+        Index('ix_level_name_gram_table_gram_parent_id', 'gram', 'parent_id'),
+        {'mysql_charset': 'utf8mb4'}
+    )
+    __tablename__ = "level_name_gram_table"
+
+    id = Column(Integer, primary_key=True)
+    parent_id = Column(Integer, index=True)  # Level's data id
+
+    gram = Column(String(3))  # n-gram of the normalized level name
+
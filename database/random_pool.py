@@ -0,0 +1,51 @@
+import asyncio
+import random
+from collections import deque
+
+from loguru import logger
+
+from database.db import Database
+from database.db_access import DBAccessLayer
+
+POOL_SIZE: int = 1000  # Level ids kept per pool
+REFILL_THRESHOLD: int = 100  # Refill a pool in the background when it gets this small
+REFILL_BLOCKS: int = 20  # Random starting points a refill reads consecutive level ids from
+
+
+class RandomLevelPool:
+    # Pre-shuffled pools of level data ids for /stage/random, one per (difficulty, include testing levels)
+    # Picking a random level is then a pop instead of sorting the whole level table.
+    def __init__(self, database: Database):
+        self.db = database
+        self.pools: dict[tuple[int | None, bool], deque[int]] = {}
+        self.refilling: set[tuple[int | None, bool]] = set()
+        self.tasks: set[asyncio.Task] = set()  # the event loop keeps only weak references to tasks
+
+    def pop(self, difficulty: int | None, include_testing: bool) -> int | None:
+        # returns None when the pool is empty, callers fall back to DBAccessLayer.get_random_level
+        # ids may be stale, callers check that the level still exists and matches the difficulty
+        key = (difficulty, include_testing)
+        pool = self.pools.setdefault(key, deque())
+        if len(pool) < REFILL_THRESHOLD and key not in self.refilling:
+            self.refilling.add(key)
+            task = asyncio.create_task(self.refill(key))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+        return pool.popleft() if pool else None
+
+    async def refill(self, key: tuple[int | None, bool]):
+        difficulty, include_testing = key
+        try:
+            async with self.db.read_session()() as session:
+                level_ids: list[int] = await DBAccessLayer(session).get_random_level_ids(
+                    difficulty=difficulty,
+                    include_testing=include_testing,
+                    count=POOL_SIZE,
+                    blocks=REFILL_BLOCKS
+                )
+            random.shuffle(level_ids)
+            self.pools[key].extend(level_ids)
+        except Exception as e:
+            logger.error(e)
+        finally:
+            self.refilling.discard(key)
@@ -0,0 +1,22 @@
+from redis.asyncio import Redis
+
+from config import DATABASE_REPLICA_STICKINESS
+
+'''
+replica:sticky:{user_id} -> set after a user's write, the user's reads go to the primary until it expires
+Only used when read replicas are configured.
+'''
+
+
+async def mark_sticky(
+        redis: Redis,
+        user_id: int
+):
+    await redis.set(f"replica:sticky:{user_id}", 1, ex=DATABASE_REPLICA_STICKINESS)
+
+
+async def is_sticky(
+        redis: Redis,
+        user_id: int
+) -> bool:
+    return (await redis.exists(f"replica:sticky:{user_id}")) > 0
@@ -0,0 +1,37 @@
+# Title search helpers
+# Level names are indexed as character n-grams in LevelNameGram, so that a title search can look up
+# candidate levels by index instead of a leading-wildcard LIKE over the whole level table.
+# n-grams are built from characters, not words, so CJK names which have no spaces work the same way.
+# The index only narrows down candidates, the database's own LIKE decides, so n-grams have to match at least
+# everything LIKE matches on any backend. They ignore case and accents like the MySQL collations.
+import unicodedata
+
+TITLE_GRAM_SIZE: int = 3
+
+
+def normalize_title(text: str) -> str:
+    # every character is mapped on its own, so a substring of a name stays a substring
+    return ''.join(
+        character for character in unicodedata.normalize('NFKD', text.casefold())
+        if not unicodedata.combining(character)
+    )
+
+
+def title_grams(text: str) -> set[str]:
+    # all n-grams of a name or query, empty when it is shorter than TITLE_GRAM_SIZE
+    text = normalize_title(text)
+    return {
+        text[i:i + TITLE_GRAM_SIZE] for i in range(len(text) - TITLE_GRAM_SIZE + 1)
+    }
+
+
+def title_query_grams(text: str) -> set[str]:
+    # n-grams looked up for a query, every TITLE_GRAM_SIZE-th one and the last one, which together cover every
+    # character; the overlapping ones in between rarely narrow the candidates further, but all have to be read
+    text = normalize_title(text)
+    count: int = len(text) - TITLE_GRAM_SIZE + 1
+    if count <= 0:
+        return set()
+    return {
+        text[i:i + TITLE_GRAM_SIZE] for i in [*range(0, count, TITLE_GRAM_SIZE), count - 1]
+    }
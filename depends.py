@@ -1,8 +1,9 @@
 from fastapi import Header, Request
 from typing import Optional
-from config import VERIFY_USER_AGENT
+from config import VERIFY_USER_AGENT, DATABASE_REPLICAS
 
 from database.db_access import DBAccessLayer
+from database.replica import is_sticky
 from session.session_access import get_session_by_id
 from models import ErrorMessageException
 
@@ -27,10 +28,42 @@ def is_valid_user(user_agent: str | None = Header(default=None)):
                 message="Illegal client.")
 
 
+async def get_user_id_or_none(request: Request) -> int | None:
+    # user of an authenticated request, for read-your-writes with read replicas
+    auth_code = (await request.form()).get("auth_code")
+    if auth_code is None:
+        return None
+    session = await get_session_by_id(request.app.state.redis, auth_code)
+    return session.user_id if session is not None else None
+
+
 async def create_dal(request: Request):
-    async with request.app.state.db.async_session() as session:
-        async with session.begin():
-            yield DBAccessLayer(session)
+    dal = DBAccessLayer(
+        redis=request.app.state.redis,
+        session_maker=request.app.state.db.async_session,
+        user_id=(await get_user_id_or_none(request)) if DATABASE_REPLICAS else None,
+        writer=request.app.state.group_commit_writer
+    )
+    try:
+        yield dal
+        await dal.finish()
+    finally:
+        await dal.close()
+
+
+async def create_read_only_dal(request: Request):
+    # for handlers that only read, each query runs in autocommit mode without BEGIN and COMMIT
+    # on a read replica, unless the user wrote something recently
+    primary: bool = False
+    if DATABASE_REPLICAS:
+        user_id = await get_user_id_or_none(request)
+        primary = user_id is not None and await is_sticky(request.app.state.redis, user_id)
+    dal = DBAccessLayer(redis=request.app.state.redis, session_maker=request.app.state.db.read_session(primary),
+                        read_only=True, replica=bool(DATABASE_REPLICAS) and not primary)
+    try:
+        yield dal
+    finally:
+        await dal.close()
 
 
 async def verify_and_get_session(request: Request):
@@ -20,13 +20,24 @@ from database.db_access import DBAccessLayer
 import routers
 from config import *
 from models import ErrorMessageException
+from cache.search import search_cache_stats
+from cache.level import level_cache, LEVEL_CACHE_CHANNEL
+from cache.user_name import user_name_cache, USER_NAME_CACHE_CHANNEL
+from cache.client import ClientCache, CLIENT_CACHE_CHANNEL
+from cache.session import session_cache, SESSION_CACHE_CHANNEL
+from cache.pubsub import listen_invalidations
+from session.session_access import register_session_scripts
+from session.signed_session import session_signer, SESSION_REVOCATION_CHANNEL
 import push
 from database.db import Database
+from database.random_pool import RandomLevelPool
+from database.counter_buffer import CounterBuffer
+from database.group_commit import GroupCommitWriter
 from storage.onedrive_cf import StorageProviderOneDriveCF
 from storage.onemanager import StorageProviderOneManager
 from storage.database import StorageProviderDatabase
 from depends import (
-    create_dal
+    create_read_only_dal
 )
 
 
@@ -42,6 +53,8 @@ async def lifespan(app: FastAPI):
     app.state.start_time = datetime.datetime.now()
     app.state.db = Database()
     await app.state.db.create_columns()
+    await app.state.db.check_schema()
+    app.state.random_pool = RandomLevelPool(app.state.db)
     app.state.connection_count = 0
     app.state.storage = {
         "onedrive-cf": StorageProviderOneDriveCF(
@@ -65,11 +78,52 @@ async def lifespan(app: FastAPI):
     )
     app.state.connection_count = 0
     app.state.connection_per_minute = 0
+    await register_session_scripts(app.state.redis)
+    app.state.client_cache = ClientCache()
+    async with app.state.db.async_session() as session:
+        await app.state.client_cache.load(DBAccessLayer(session))
+    if DATABASE_COUNTER_BUFFER:
+        app.state.counter_buffer = CounterBuffer(
+            redis=app.state.redis,
+            database=app.state.db,
+            flush_interval=DATABASE_COUNTER_FLUSH_INTERVAL
+        )
+        await app.state.counter_buffer.recover(scan=True)
+        asyncio.create_task(app.state.counter_buffer.run())
+    else:
+        app.state.counter_buffer = None
+    if DATABASE_ADAPTER == 'sqlite' and DATABASE_SQLITE_GROUP_COMMIT:
+        app.state.group_commit_writer = GroupCommitWriter(
+            redis=app.state.redis,
+            window=DATABASE_SQLITE_GROUP_COMMIT_WINDOW
+        )
+        app.state.group_commit_writer.start()
+    else:
+        app.state.group_commit_writer = None
+    asyncio.create_task(listen_invalidations(
+        app.state.redis, LEVEL_CACHE_CHANNEL, level_cache.invalidate, level_cache.clear
+    ))
+    asyncio.create_task(listen_invalidations(
+        app.state.redis, USER_NAME_CACHE_CHANNEL, user_name_cache.invalidate, user_name_cache.clear
+    ))
+    asyncio.create_task(listen_invalidations(
+        app.state.redis, CLIENT_CACHE_CHANNEL, app.state.client_cache.invalidate, app.state.client_cache.clear
+    ))
+    asyncio.create_task(listen_invalidations(
+        app.state.redis, SESSION_CACHE_CHANNEL, session_cache.invalidate, session_cache.clear
+    ))
+    asyncio.create_task(listen_invalidations(
+        app.state.redis, SESSION_REVOCATION_CHANNEL, session_signer.revoked, session_signer.clear
+    ))
     asyncio.create_task(connection_per_minute_record())
     asyncio.create_task(push.push_to_engine_bot_sub())
     asyncio.create_task(push.push_to_engine_bot_discord_sub())
     yield
-    await app.state.redis.flushdb()
+    if app.state.group_commit_writer is not None:
+        await app.state.group_commit_writer.close()
+    if app.state.counter_buffer is not None:
+        await app.state.counter_buffer.flush()
+    # Redis is shared by all workers, so nothing is cleared here
     await app.state.redis.close()
 
 
@@ -135,8 +189,8 @@ async def docs_handler() -> RedirectResponse:
 # get server status
 @app.get("/server_stats")
 async def server_stats(
-        dal: DBAccessLayer = Depends(create_dal),
-        request: Request
+        request: Request,
+        dal: DBAccessLayer = Depends(create_read_only_dal)
 ) -> dict:
     return {
         "os": platform.platform().replace('-', ' '),
@@ -145,6 +199,12 @@ async def server_stats(
         "level_count": await dal.get_level_count(),
         "uptime": (datetime.datetime.now() - request.app.state.start_time).seconds,
         "connection_per_minute": request.app.state.connection_per_minute,
+        "search_cache_hits": search_cache_stats["hits"],
+        "search_cache_misses": search_cache_stats["misses"],
+        "level_cache_hits": level_cache.stats["hits"],
+        "level_cache_misses": level_cache.stats["misses"],
+        "level_cache_evictions": level_cache.stats["evictions"],
+        "db_pool_checkouts": request.app.state.db.pool_stats["checkouts"],
     }
 
 
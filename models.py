@@ -126,6 +126,7 @@ class DetailedSearchResults(PydanticModel):
     num_rows: int
     rows_perpage: int
     pages: int
+    next_cursor: Optional[str] = None  # Keyset pagination cursor of the next page
     result: list[LevelDetails]
 
 
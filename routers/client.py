@@ -1,4 +1,4 @@
-from fastapi import Form, Depends
+from fastapi import Form, Depends, Request
 from routers.api_router import APIRouter
 
 from config import API_KEY
@@ -14,7 +14,7 @@ from common import (
 )
 from database.db_access import DBAccessLayer
 from database.models import Client
-from depends import create_dal, connection_count_inc
+from depends import create_dal, create_read_only_dal, connection_count_inc
 
 router = APIRouter(
     prefix="/client",
@@ -24,6 +24,7 @@ router = APIRouter(
 
 @router.post("/new")
 async def client_new_handler(
+        request: Request,
         api_key: str = Form(),
         token: str = Form(),
         client_type: str = Form(),
@@ -47,7 +48,7 @@ async def client_new_handler(
             message="Invalid locale."
         )
     client_type_value = ClientType[client_type].value
-    await dal.new_client(
+    client: Client = await dal.new_client(
         token=token,
         client_type=client_type_value,
         locale=locale,
@@ -55,6 +56,7 @@ async def client_new_handler(
         proxied=proxied
     )
     await dal.commit()
+    await request.app.state.client_cache.changed(request.app.state.redis, token, client)
     return ClientSuccessMessage(
         success="Successfully created client.",
         token=token,
@@ -68,7 +70,7 @@ async def client_new_handler(
 @router.post("/list")
 async def client_list_handler(
         api_key: str = Form(),
-        dal: DBAccessLayer = Depends(create_dal)
+        dal: DBAccessLayer = Depends(create_read_only_dal)
 ):
     if api_key != API_KEY:
         return APIKeyErrorMessage(api_key=api_key)
@@ -89,6 +91,7 @@ async def client_list_handler(
 
 @router.post("/{token}/revoke")
 async def client_revoke_handler(
+        request: Request,
         token: str,
         api_key: str = Form(),
         dal: DBAccessLayer = Depends(create_dal)
@@ -103,6 +106,7 @@ async def client_revoke_handler(
         )
     await dal.revoke_client(client=client)
     await dal.commit()
+    await request.app.state.client_cache.changed(request.app.state.redis, token, client)
     return ClientSuccessMessage(
         success="Successfully revoked client.",
         token=token
@@ -111,6 +115,7 @@ async def client_revoke_handler(
 
 @router.post("/{token}/delete")
 async def client_delete_handler(
+        request: Request,
         token: str,
         api_key: str = Form(),
         dal: DBAccessLayer = Depends(create_dal)
@@ -125,6 +130,7 @@ async def client_delete_handler(
         )
     await dal.delete_client(client=client)
     await dal.commit()
+    await request.app.state.client_cache.changed(request.app.state.redis, token, None)
     return ClientSuccessMessage(
         success="Successfully deleted client.",
         token=token
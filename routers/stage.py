@@ -6,7 +6,7 @@ from fastapi import Form, Depends, Request
 from routers.api_router import APIRouter
 from fastapi.responses import RedirectResponse, Response
 from typing import Optional
-from sqlalchemy import select, func, and_, or_
+from sqlalchemy import select, and_, or_, tuple_
 import aiohttp
 from loguru import logger
 
@@ -24,6 +24,7 @@ from config import (
 from depends import (
     is_valid_user,
     create_dal,
+    create_read_only_dal,
     verify_and_get_session,
     connection_count_inc
 )
@@ -34,6 +35,7 @@ from models import (
     LevelDetails,
     SingleLevelDetails,
     DetailedSearchResults,
+    LevelDetailsUserData,
     UserErrorMessage
 )
 from common import (
@@ -42,6 +44,7 @@ from common import (
     gen_level_id_sha1,
     gen_level_id_sha256,
     level_to_details,
+    string_latinify,
     ClientType,
     get_locale_model
 )
@@ -52,6 +55,17 @@ from push import (
 from database.db_access import DBAccessLayer
 from database.models import *
 from session.models import Session
+from cache.catalog import (
+    filter_signature,
+    get_catalog_version,
+    bump_catalog_version,
+    get_cached_level_count,
+    set_cached_level_count
+)
+from cache.search import (
+    get_cached_search_page,
+    set_cached_search_page
+)
 
 router = APIRouter(
     prefix="/stage",
@@ -63,22 +77,64 @@ router = APIRouter(
 
 
 async def get_author_name_by_level(level: Level, dal: DBAccessLayer) -> str:
-    author_user = await dal.get_user_by_id(level.author_id)
-    if author_user is None:
+    author_name = await dal.get_user_name_by_id(level.author_id)
+    if author_name is None:
         return "Unknown"
     else:
-        return author_user.username
+        return author_name
+
+
+async def get_user_names_by_levels(levels: list[Level], dal: DBAccessLayer) -> dict[int, str]:
+    # resolve authors and record holders of all levels in one query
+    user_ids: set[int] = set()
+    for level in levels:
+        user_ids.add(level.author_id)
+        if level.record_user_id != 0:
+            user_ids.add(level.record_user_id)
+    return await dal.get_user_names_by_ids(user_ids)
 
 
-async def get_record_user_name_by_level(level: Level, dal: DBAccessLayer) -> str:
+def get_author_name_from_map(level: Level, user_names: dict[int, str]) -> str:
+    return user_names.get(level.author_id, "Unknown")
+
+
+def get_record_user_name_from_map(level: Level, user_names: dict[int, str]) -> str:
     if level.record_user_id == 0:
         return "None"
     else:
-        record_user = await dal.get_user_by_id(level.record_user_id)
-        if record_user is None:
-            return "Unknown"
-        else:
-            return record_user.username
+        return user_names.get(level.record_user_id, "Unknown")
+
+
+def parse_cursor(cursor: str, with_order_key: bool) -> tuple[int | None, int]:
+    # cursor is "<level.id>" for listings ordered by id, or "<order key>_<level.id>"
+    if with_order_key:
+        order_key, _, level_id = cursor.partition("_")
+        return int(order_key), int(level_id)
+    else:
+        return None, int(cursor)
+
+
+def generate_cursor(level: Level, order_key_value) -> str:
+    if order_key_value is None:
+        return str(level.id)
+    else:
+        return f"{order_key_value(level)}_{level.id}"
+
+
+def keyset_condition(order_key, descending: bool, after_key: int | None, after_id: int):
+    # rows strictly after (after_key, after_id) in the listing order
+    if descending:
+        id_condition = Level.id < after_id
+    else:
+        id_condition = Level.id > after_id
+    if order_key is None:
+        return id_condition
+    # a row value comparison, so the (order_key, id) index is searched from the cursor on
+    # the plain bound on order_key is for MySQL, which does not search an index by row values
+    if descending:
+        return and_(order_key <= after_key, tuple_(order_key, Level.id) < tuple_(after_key, after_id))
+    else:
+        return and_(order_key >= after_key, tuple_(order_key, Level.id) > tuple_(after_key, after_id))
 
 
 # router.post("s/detailed_search") == stages/detailed_search
@@ -99,34 +155,43 @@ async def stages_detailed_search_handler(
         dificultad: Optional[str] = Form(None),
         rows_perpage: Optional[str] = Form(None),
         tags: Optional[str] = Form(None),
-        dal: DBAccessLayer = Depends(create_dal),
+        cursor: Optional[str] = Form(None),
+        estimate: Optional[str] = Form(None),
+        dal: DBAccessLayer = Depends(create_read_only_dal),
         auth_code: str = Form(),
         session: Session = Depends(verify_and_get_session)
 ):  # Detailed search (level list)
     storage = request.app.state.storage
+    redis = request.app.state.redis
     client_type = ClientType(session.client_type)
     locale_model = get_locale_model(session.locale)
 
     results: list[LevelDetails] = []
+    tag_ids: str | None = None  # normalized tags filter
 
     # Filter and search
     selection = select(Level)
 
+    # Listings are ordered by (order_key, Level.id), order_key is None when ordered by id only
+    # latest levels by default
+    order_key = None
+    order_key_value = None  # order key of a loaded level, used for cursors
+    descending: bool = True
+
     if featured:
         match featured:
             case "promising":
                 # featured levels
-                selection = selection.where(Level.featured == True).order_by(Level.id.desc())
+                selection = selection.where(Level.featured == True)
             case "popular":
                 # popular levels
-                selection = selection.order_by((Level.likes - Level.dislikes).desc())
+                order_key = Level.score
+                order_key_value = lambda level: level.score
             case "notpromising":
                 # not featured levels (post-3.3.0)
                 selection = selection.where(Level.featured == False)
             case _:
                 return ErrorMessage(error_type="031", message=locale_model.UNKNOWN_QUERY_MODE)
-    else:
-        selection = selection.order_by(Level.id.desc())  # latest levels
 
     # avoid non-testing client error
     if client_type is not ClientType.TESTING:
@@ -141,7 +206,7 @@ async def stages_detailed_search_handler(
     # detailed search
     if title:
         title = title.encode("latin1").decode("utf-8")
-        selection = selection.where(Level.name.contains(title))
+        selection = selection.where(dal.title_contains(title))
     if author:
         _author = await dal.get_user_by_username(author)
         if _author is not None:
@@ -164,7 +229,9 @@ async def stages_detailed_search_handler(
     if sort:
         match sort:
             case "antiguos":
-                selection = selection.order_by(Level.id.asc())
+                order_key = None
+                order_key_value = None
+                descending = False
             case "popular":
                 # post-3.3.0
                 selection = selection.where(
@@ -173,32 +240,19 @@ async def stages_detailed_search_handler(
                         datetime.date.today(),
                     )
                 )
-                selection = selection.order_by((Level.likes - Level.dislikes).desc())
+                order_key = Level.score
+                order_key_value = lambda level: level.score
             case _:
                 return ErrorMessage(error_type="031", message=locale_model.UNKNOWN_QUERY_MODE)
     if liked:
-        level_data_ids: list[int] = []  # Liked levels' data ids
-        for liked_data in await dal.get_liked_levels_by_user(session.user_id):
-            if liked_data.parent_id not in level_data_ids:
-                level_data_ids.append(liked_data.parent_id)
-        selection = selection.where(Level.id.in_(level_data_ids))
+        selection = selection.where(dal.liked_by_user(session.user_id))
     elif disliked:
-        level_data_ids: list[int] = []  # Disliked levels' data ids
-        for disliked_data in await dal.get_disliked_levels_by_user(session.user_id):
-            if disliked_data.parent_id not in level_data_ids:
-                level_data_ids.append(disliked_data.parent_id)
-        selection = selection.where(Level.id.in_(level_data_ids))
+        selection = selection.where(dal.disliked_by_user(session.user_id))
     if dificultad:
-        selection = selection.where(Level.plays != 0)
         match dificultad:
-            case "0":
-                selection = selection.where((Level.clears / Level.plays).between(0.2, 10.0))  # Easy
-            case "1":
-                selection = selection.where((Level.clears / Level.plays).between(0.08, 0.2))  # Normal
-            case "2":
-                selection = selection.where((Level.clears / Level.plays).between(0.01, 0.08))  # Hard
-            case "3":
-                selection = selection.where((Level.clears / Level.plays).between(0.0, 0.01))  # Expert
+            case "0" | "1" | "2" | "3":
+                # Easy, Normal, Hard, Expert
+                selection = selection.where(Level.difficulty == int(dificultad))
             case _:
                 return ErrorMessage(error_type="030", message=locale_model.UNKNOWN_DIFFICULTY)
     if tags:
@@ -206,7 +260,9 @@ async def stages_detailed_search_handler(
         tag_1, tag_2 = parse_tag_names(tags, session.locale)
         if tag_2==16:
             selection = selection.where(or_(Level.tag_1 == tag_1, Level.tag_2 == tag_1))
+            tag_ids = str(tag_1)
         else:
+            tag_ids = f"{min(tag_1, tag_2)},{max(tag_1, tag_2)}"
             selection = selection.where(or_(
                 and_(Level.tag_1 == tag_1, Level.tag_2 == tag_2),
                 and_(Level.tag_1 == tag_2, Level.tag_2 == tag_1)
@@ -217,25 +273,101 @@ async def stages_detailed_search_handler(
             return ErrorMessage(error_type="255", message=locale_model.NOT_IMPLEMENTED)
         else:
             if historial in ["0", "1"]:
-                level_data_ids_cleared: list[int] = []  # Cleared levels' data ids
-                for cleared_data in await dal.get_cleared_levels_by_user(session.user_id):
-                    if cleared_data.parent_id not in level_data_ids_cleared:
-                        level_data_ids_cleared.append(cleared_data.parent_id)
                 if historial == "0":  # cleared
-                    selection = selection.where(Level.id.in_(level_data_ids_cleared))
+                    selection = selection.where(dal.cleared_by_user(session.user_id))
                 if historial == "1":  # not cleared
-                    selection = selection.where(Level.id.not_in(level_data_ids_cleared))
+                    selection = selection.where(~dal.cleared_by_user(session.user_id))
             else:
                 return ErrorMessage(error_type="031", message=locale_model.UNKNOWN_QUERY_MODE)
 
+    # keyset pagination, page is ignored when a cursor is given
+    if cursor:
+        try:
+            after_key, after_id = parse_cursor(cursor, order_key is not None)
+        except ValueError:
+            return ErrorMessage(error_type="031", message=locale_model.UNKNOWN_QUERY_MODE)
+
     # get numbers
-    num_rows: int = await dal.get_level_count(selection)
+    # counts of listings shared by all users are cached until the catalog changes
+    if title or author or liked or disliked or historial:
+        count_signature: str | None = None
+    else:
+        count_signature: str | None = filter_signature(
+            featured=featured,
+            aparience=aparience,
+            entorno=entorno,
+            tags=tag_ids,
+            dificultad=dificultad,
+            last=last,
+            sort=sort,
+            testing=(client_type is ClientType.TESTING),
+            # date windows move every day
+            date=(datetime.date.today().isoformat() if (last or sort == "popular") else None)
+        )
+
+    if count_signature is not None:
+        catalog_version: int | None = await get_catalog_version(redis)
+        if catalog_version is None:
+            count_signature = None  # Redis is unavailable, count and page go to the database
+
+    # so are the pages themselves, apart from the user's own like and clear flags
+    page_signature: str | None = None
+    if count_signature is not None:
+        page_signature = filter_signature(
+            listing=count_signature,
+            page=page,
+            cursor=cursor,
+            estimate=estimate,
+            rows_perpage=rows_perpage,
+            locale=session.locale,
+            mobile=session.mobile
+        )
+        cached_page = await get_cached_search_page(redis, catalog_version, page_signature)
+        if cached_page is not None:
+            level_data_ids, page_data = cached_page
+            search_results = DetailedSearchResults.model_validate(page_data)
+            user_data: dict[int, tuple[str, str]] = await dal.get_user_data_by_levels(
+                level_data_ids, session.user_id
+            )
+            for level_details, level_data_id in zip(search_results.result, level_data_ids):
+                level_details.user_data = LevelDetailsUserData(
+                    completed=user_data[level_data_id][1],
+                    liked=user_data[level_data_id][0]
+                )
+            return search_results
+
+    num_rows: int | None = None
+    if count_signature is not None:
+        num_rows = await get_cached_level_count(redis, catalog_version, count_signature)
+    if num_rows is None and not estimate:
+        num_rows = await dal.get_level_count(selection)
+        if count_signature is not None:
+            await set_cached_level_count(redis, catalog_version, count_signature, num_rows)
+    # in estimated mode without a cached count, probe one more row instead of counting
+    limit: int = ROWS_PERPAGE if num_rows is not None else ROWS_PERPAGE + 1
+
+    # ordering
+    if order_key is not None:
+        selection = selection.order_by(order_key.desc() if descending else order_key.asc())
+    selection = selection.order_by(Level.id.desc() if descending else Level.id.asc())
 
     # pagination
-    selection = selection.offset((page - 1) * ROWS_PERPAGE).limit(ROWS_PERPAGE)
+    if cursor:
+        selection = selection.where(
+            keyset_condition(order_key, descending, after_key, after_id)
+        ).limit(limit)
+    else:
+        selection = selection.offset((page - 1) * ROWS_PERPAGE).limit(limit)
 
     # do query
     levels = await dal.execute_selection(selection)
+    if num_rows is None:
+        num_rows = (page - 1) * ROWS_PERPAGE + len(levels)
+        levels = levels[:ROWS_PERPAGE]
+    if len(levels) == ROWS_PERPAGE:
+        next_cursor: str | None = generate_cursor(levels[-1], order_key_value)
+    else:
+        next_cursor: str | None = None
 
     if num_rows > ROWS_PERPAGE:
         rows_perpage: int = int(rows_perpage) if rows_perpage is not None else ROWS_PERPAGE
@@ -245,10 +377,15 @@ async def stages_detailed_search_handler(
         pages = 1
 
     # get results
+    result_level_data_ids: list[int] = []
+    user_names: dict[int, str] = await get_user_names_by_levels(levels, dal)
+    user_data: dict[int, tuple[str, str]] = await dal.get_user_data_by_levels(
+        [level.id for level in levels], session.user_id
+    )
     for level in levels:
         try:
-            author_name: str = await get_author_name_by_level(level, dal)
-            record_user_name: str = await get_record_user_name_by_level(level, dal)
+            author_name: str = get_author_name_from_map(level, user_names)
+            record_user_name: str = get_record_user_name_from_map(level, user_names)
             level_file_url: str = storage.generate_url(level.level_id)
             results.append(
                 level_to_details(
@@ -256,12 +393,13 @@ async def stages_detailed_search_handler(
                     locale=session.locale,
                     level_file_url=level_file_url,
                     mobile=session.mobile,
-                    like_type=await dal.get_like_type(level, session.user_id),
-                    clear_type=await dal.get_clear_type(level, session.user_id),
+                    like_type=user_data[level.id][0],
+                    clear_type=user_data[level.id][1],
                     author=author_name,
                     record_user=record_user_name
                 )
             )
+            result_level_data_ids.append(level.id)
         except Exception as e:
             logger.error(e)
     await dal.commit()
@@ -270,41 +408,64 @@ async def stages_detailed_search_handler(
             error_type="029", message=locale_model.LEVEL_NOT_FOUND
         )  # No level found
     else:
-        return DetailedSearchResults(
+        search_results = DetailedSearchResults(
             num_rows=num_rows,
             rows_perpage=rows_perpage,
             pages=pages,
+            next_cursor=next_cursor,
             result=results
         )
+        if page_signature is not None:
+            await set_cached_search_page(
+                redis, catalog_version, page_signature, result_level_data_ids, search_results.model_dump()
+            )
+        return search_results
 
 
 @router.post("/{level_id}/stats/likes")
 async def stats_likes_handler(
+        request: Request,
         level_id: str,
         dal: DBAccessLayer = Depends(create_dal),
         auth_code: str = Form(),
         session: Session = Depends(verify_and_get_session)
 ):
+    counter_buffer = request.app.state.counter_buffer
     locale_model = get_locale_model(session.locale)
-    level: Level = await dal.get_level_by_level_id(level_id)
-    if level is not None:
-        await dal.add_like_to_level(user_id=session.user_id, level=level)
-        await dal.commit()
+    likes_change: int = 0
+    dislikes_change: int = 0
+    if counter_buffer is not None:
+        level: Level | None = await dal.get_level_by_level_id(level_id)
+        if level is not None:
+            likes_change, dislikes_change = await dal.add_like_user(user_id=session.user_id, level=level)
     else:
+        level, liked = await dal.add_like_to_level(user_id=session.user_id, level_id=level_id)
+    if level is None:
         return ErrorMessage(
             error_type="029", message=locale_model.LEVEL_NOT_FOUND
         )  # No level found
-    if level.likes == 100 or level.likes == 1000:
+    await dal.commit()
+    # repeated likes are ignored, and must not count towards milestones
+    likes: int | None = None
+    if counter_buffer is not None:
+        if dislikes_change:
+            await counter_buffer.incr(level, 'dislikes', dislikes_change)
+        if likes_change:
+            likes = await counter_buffer.incr(level, 'likes', likes_change)
+    elif liked:
+        likes = level.likes
+    if likes == 100 or likes == 1000:
+        await bump_catalog_version(request.app.state.redis)  # cached pages show the milestone
         if ENABLE_DISCORD_WEBHOOK or (ENABLE_ENGINE_BOT_WEBHOOK and ENABLE_ENGINE_BOT_COUNTER_WEBHOOK):
             author_name: str = await get_author_name_by_level(level, dal)
             if ENABLE_DISCORD_WEBHOOK:
                 await push_to_engine_bot_discord(
-                    f"🎉 Felicidades, el **{level.name}** de **{author_name}** tiene **{level.likes}** me gusta!\n"
+                    f"🎉 Felicidades, el **{level.name}** de **{author_name}** tiene **{likes}** me gusta!\n"
                     f"> ID: `{level_id}`"
                 )
             if ENABLE_ENGINE_BOT_WEBHOOK and ENABLE_ENGINE_BOT_COUNTER_WEBHOOK:
                 await push_to_engine_bot({
-                    "type": f"{level.likes}_likes",
+                    "type": f"{likes}_likes",
                     "level_id": level_id,
                     "level_name": level.name,
                     "author": author_name,
@@ -314,15 +475,28 @@ async def stats_likes_handler(
 
 @router.post("/{level_id}/stats/dislikes", dependencies=[Depends(is_valid_user)])
 async def stats_dislikes_handler(
+        request: Request,
         level_id: str,
         dal: DBAccessLayer = Depends(create_dal),
         session: Session = Depends(verify_and_get_session)
 ):
+    counter_buffer = request.app.state.counter_buffer
     locale_model = get_locale_model(session.locale)
-    level = await dal.get_level_by_level_id(level_id)
+    likes_change: int = 0
+    dislikes_change: int = 0
+    if counter_buffer is not None:
+        level: Level | None = await dal.get_level_by_level_id(level_id)
+        if level is not None:
+            likes_change, dislikes_change = await dal.add_dislike_user(user_id=session.user_id, level=level)
+    else:
+        level, _ = await dal.add_dislike_to_level(user_id=session.user_id, level_id=level_id)
     if level is not None:
-        await dal.add_dislike_to_level(user_id=session.user_id, level=level)
         await dal.commit()
+        if counter_buffer is not None:
+            if likes_change:
+                await counter_buffer.incr(level, 'likes', likes_change)
+            if dislikes_change:
+                await counter_buffer.incr(level, 'dislikes', dislikes_change)
         return StageSuccessMessage(success="Successfully updated dislikes", type="stats", id=level_id)
     else:
         return ErrorMessage(
@@ -404,9 +578,6 @@ async def stages_upload_handler(
                 return ErrorMessage(
                     error_type="009", message=locale_model.LEVEL_ID_REPEAT
                 )
-    user.uploads += 1
-    await dal.update_user(user=user)
-
     # description
     if desc == "":
         desc = 'Sin descripción'
@@ -419,6 +590,9 @@ async def stages_upload_handler(
         return ErrorMessage(
             error_type="010", message=locale_model.UPLOAD_CONNECT_ERROR
         )
+    # after the storage upload, which writes in its own transaction with the database provider
+    user.uploads += 1
+    await dal.update_user(user=user)
 
     tag_1, tag_2 = parse_tag_names(tags, session.locale)
     await dal.add_level(
@@ -430,6 +604,7 @@ async def stages_upload_handler(
         author_id=session.user_id,
         level_id=level_id,
         non_latin=non_latin,
+        latin_name=(string_latinify(name) if non_latin else None),
         testing_client=(True if client_type is ClientType.TESTING else False),
         description=desc
     )  # add new level to database
@@ -448,6 +623,7 @@ async def stages_upload_handler(
             "author": user.username,
         })
     await dal.commit()
+    await bump_catalog_version(request.app.state.redis)
     return StageSuccessMessage(success="Successfully uploaded level", type="upload", id=level_id)
 
 
@@ -455,30 +631,39 @@ async def stages_upload_handler(
 async def stage_id_random_handler(
         request: Request,
         dificultad: Optional[str] = Form(None),
-        dal: DBAccessLayer = Depends(create_dal),
+        dal: DBAccessLayer = Depends(create_read_only_dal),
         auth_code: str = Form(),
         session: Session = Depends(verify_and_get_session)
 ):  # Random level
     storage = request.app.state.storage
+    client_type = ClientType(session.client_type)
     locale_model = get_locale_model(session.locale)
     user_id: int = session.user_id
-    selection = select(Level).order_by(func.random()).limit(1)
+    difficulty: int | None = None
     if dificultad:
-        selection = selection.where(Level.plays != 0)
         match dificultad:
-            case "0":
-                selection = selection.where((Level.clears / Level.plays).between(0.2, 10.0))  # Easy
-            case "1":
-                selection = selection.where((Level.clears / Level.plays).between(0.08, 0.2))  # Normal
-            case "2":
-                selection = selection.where((Level.clears / Level.plays).between(0.01, 0.08))  # Hard
-            case "3":
-                selection = selection.where((Level.clears / Level.plays).between(0.0, 0.01))  # Expert
+            case "0" | "1" | "2" | "3":
+                # Easy, Normal, Hard, Expert
+                difficulty = int(dificultad)
             case _:
                 return ErrorMessage(error_type="030", message=locale_model.UNKNOWN_DIFFICULTY)
-    level: Level = (await dal.execute_selection(selection))[0]
-    author_name: str = await get_author_name_by_level(level, dal)
-    record_user_name: str = await get_record_user_name_by_level(level, dal)
+    # avoid non-testing client error
+    include_testing: bool = client_type is ClientType.TESTING
+    level: Level | None = None
+    level_data_id: int | None = request.app.state.random_pool.pop(difficulty, include_testing)
+    if level_data_id is not None:
+        level = await dal.get_level_by_id(level_data_id)  # None if deleted meanwhile
+        if level is not None and difficulty is not None and level.difficulty != difficulty:
+            level = None  # plays and clears moved it to another difficulty since the pool was filled
+    if level is None:
+        level = await dal.get_random_level(difficulty, include_testing)
+    if level is None:
+        return ErrorMessage(
+            error_type="029", message=locale_model.LEVEL_NOT_FOUND
+        )  # No level found
+    user_names: dict[int, str] = await get_user_names_by_levels([level], dal)
+    author_name: str = get_author_name_from_map(level, user_names)
+    record_user_name: str = get_record_user_name_from_map(level, user_names)
     level_file_url: str = storage.generate_url(level.level_id)
     return SingleLevelDetails(
         type="random",
@@ -499,7 +684,7 @@ async def stage_id_random_handler(
 async def stage_id_search_handler(
         request: Request,
         level_id: str,
-        dal: DBAccessLayer = Depends(create_dal),
+        dal: DBAccessLayer = Depends(create_read_only_dal),
         auth_code: str = Form(),
         session: Session = Depends(verify_and_get_session)
 ):  # Level ID search
@@ -509,8 +694,9 @@ async def stage_id_search_handler(
     level: Level | None = await dal.get_level_by_level_id(level_id=level_id)
     level_file_url: str = storage.generate_url(level.level_id)
     if level is not None:
-        author_name: str = await get_author_name_by_level(level, dal)
-        record_user_name: str = await get_record_user_name_by_level(level, dal)
+        user_names: dict[int, str] = await get_user_names_by_levels([level], dal)
+        author_name: str = get_author_name_from_map(level, user_names)
+        record_user_name: str = get_record_user_name_from_map(level, user_names)
         return SingleLevelDetails(
             type="id",
             result=level_to_details(
@@ -534,7 +720,7 @@ async def stage_id_search_handler(
 async def stage_file_handler(
         request: Request,
         level_id: str,
-        dal: DBAccessLayer = Depends(create_dal)
+        dal: DBAccessLayer = Depends(create_read_only_dal)
 ):  # Return level data
     storage = request.app.state.storage
     match storage.type:
@@ -588,6 +774,7 @@ async def stage_delete_handler(
     user.uploads -= 1
     await dal.update_user(user=user)
     await dal.commit()
+    await bump_catalog_version(request.app.state.redis)
     if storage.type == 'database':
         await storage.delete_level(level_id=level_id)
 
@@ -598,6 +785,7 @@ async def stage_delete_handler(
 
 @router.post("/{level_id}/switch/promising")
 async def switch_promising_handler(
+        request: Request,
         level_id: str,
         auth_code: str = Form(),
         dal: DBAccessLayer = Depends(create_dal),
@@ -623,6 +811,7 @@ async def switch_promising_handler(
     if not level.featured:
         await dal.set_featured(level=level, is_featured=True)
         await dal.commit()
+        await bump_catalog_version(request.app.state.redis)
         if ENABLE_DISCORD_WEBHOOK or (ENABLE_ENGINE_BOT_WEBHOOK and ENABLE_ENGINE_BOT_COUNTER_WEBHOOK):
             author_name: str = await get_author_name_by_level(level, dal)
             if ENABLE_DISCORD_WEBHOOK:
@@ -643,6 +832,7 @@ async def switch_promising_handler(
     else:
         await dal.set_featured(level=level, is_featured=False)
         await dal.commit()
+        await bump_catalog_version(request.app.state.redis)
         return StageSuccessMessage(
             success="Successfully removed featured level", type="stage", id=level_id
         )
@@ -662,29 +852,38 @@ async def switch_promising_330_handler(
 
 @router.post("/{level_id}/stats/intentos")
 async def stats_intentos_handler(
+        request: Request,
         level_id: str,
         dal: DBAccessLayer = Depends(create_dal),
         auth_code: str = Form(),
         session: Session = Depends(verify_and_get_session)
 ):
-    level: Level | None = await dal.get_level_by_level_id(level_id=level_id)
+    counter_buffer = request.app.state.counter_buffer
+    if counter_buffer is not None:
+        level: Level | None = await dal.get_level_by_level_id(level_id=level_id)
+    else:
+        level = await dal.add_play_to_level(level_id=level_id)
     if level is None:
         return ErrorMessage(
             error_type="029", message="Level not found."
         )  # No level found
-    await dal.add_play_to_level(level=level)
-    await dal.commit()
-    if level.plays == 100 or level.plays == 1000:
+    if counter_buffer is not None:
+        plays: int = await counter_buffer.incr(level, 'plays')
+    else:
+        await dal.commit()
+        plays: int = level.plays
+    if plays == 100 or plays == 1000:
+        await bump_catalog_version(request.app.state.redis)  # cached pages show the milestone
         if ENABLE_DISCORD_WEBHOOK or (ENABLE_ENGINE_BOT_WEBHOOK and ENABLE_ENGINE_BOT_COUNTER_WEBHOOK):
             author_name: str = await get_author_name_by_level(level, dal)
             if ENABLE_DISCORD_WEBHOOK:
                 await push_to_engine_bot_discord(
-                    f"🎉 Felicidades, el **{level.name}** de **{author_name}** ha sido reproducido **{level.plays}** veces!\n"
+                    f"🎉 Felicidades, el **{level.name}** de **{author_name}** ha sido reproducido **{plays}** veces!\n"
                     f"> ID: `{level_id}`"
                 )
             if ENABLE_ENGINE_BOT_WEBHOOK and ENABLE_ENGINE_BOT_COUNTER_WEBHOOK:
                 await push_to_engine_bot({
-                    "type": f"{level.plays}_plays",
+                    "type": f"{plays}_plays",
                     "level_id": level_id,
                     "level_name": level.name,
                     "author": author_name,
@@ -696,33 +895,38 @@ async def stats_intentos_handler(
 
 @router.post("/{level_id}/stats/victorias")
 async def stats_victorias_handler(
+        request: Request,
         level_id: str,
         tiempo: str = Form(),
         dal: DBAccessLayer = Depends(create_dal),
         auth_code: str = Form(),
         session: Session = Depends(verify_and_get_session)
 ):
-    level: Level | None = await dal.get_level_by_level_id(level_id=level_id)
+    counter_buffer = request.app.state.counter_buffer
+    level: Level | None = await dal.add_clear_to_level(
+        user_id=session.user_id, level_id=level_id, record=int(tiempo), count=counter_buffer is None
+    )
     if level is None:
         return ErrorMessage(
             error_type="029", message="Level not found."
         )  # No level found
-    await dal.add_clear_to_level(level=level, user_id=session.user_id)
-    new_record: int = int(tiempo)
-    if level.record == 0 or level.record > new_record:
-        await dal.update_record_to_level(user_id=session.user_id, level=level, record=new_record)
     await dal.commit()
-    if level.clears == 100 or level.clears == 1000:
+    if counter_buffer is not None:
+        clears: int = await counter_buffer.incr(level, 'clears')
+    else:
+        clears: int = level.clears
+    if clears == 100 or clears == 1000:
+        await bump_catalog_version(request.app.state.redis)  # cached pages show the milestone
         if ENABLE_DISCORD_WEBHOOK or (ENABLE_ENGINE_BOT_WEBHOOK and ENABLE_ENGINE_BOT_COUNTER_WEBHOOK):
             author_name: str = await get_author_name_by_level(level, dal)
             if ENABLE_DISCORD_WEBHOOK:
                 await push_to_engine_bot_discord(
-                    f"🎉 Felicidades, el **{level.name}** de **{author_name}** ha salido victorioso **{level.clears}** veces!\n"
+                    f"🎉 Felicidades, el **{level.name}** de **{author_name}** ha salido victorioso **{clears}** veces!\n"
                     f"> ID: `{level_id}`"
                 )
             if ENABLE_ENGINE_BOT_WEBHOOK and ENABLE_ENGINE_BOT_COUNTER_WEBHOOK:
                 await push_to_engine_bot({
-                    "type": f"{level.clears}_clears",
+                    "type": f"{clears}_clears",
                     "level_id": level_id,
                     "level_name": level.name,
                     "author": author_name,
@@ -734,23 +938,32 @@ async def stats_victorias_handler(
 
 @router.post("/{level_id}/stats/muertes")
 async def stats_muertes_handler(
+        request: Request,
         level_id: str,
         dal: DBAccessLayer = Depends(create_dal),
         auth_code: str = Form(),
         session: Session = Depends(verify_and_get_session)
 ):
-    level: Level | None = await dal.get_level_by_level_id(level_id=level_id)
+    counter_buffer = request.app.state.counter_buffer
+    if counter_buffer is not None:
+        level: Level | None = await dal.get_level_by_level_id(level_id=level_id)
+    else:
+        level = await dal.add_death_to_level(level_id=level_id)
     if level is None:
         return ErrorMessage(
             error_type="029", message="Level not found."
         )  # No level found
-    await dal.add_death_to_level(level=level)
-    await dal.commit()
-    if level.deaths == 100 or level.deaths == 1000:
+    if counter_buffer is not None:
+        deaths: int = await counter_buffer.incr(level, 'deaths')
+    else:
+        await dal.commit()
+        deaths: int = level.deaths
+    if deaths == 100 or deaths == 1000:
+        await bump_catalog_version(request.app.state.redis)  # cached pages show the milestone
         if ENABLE_ENGINE_BOT_WEBHOOK and ENABLE_ENGINE_BOT_COUNTER_WEBHOOK:
             author_name: str = await get_author_name_by_level(level, dal)
             await push_to_engine_bot({
-                "type": f"{level.deaths}_deaths",
+                "type": f"{deaths}_deaths",
                 "level_id": level_id,
                 "level_name": level.name,
                 "author": author_name,
@@ -36,6 +36,7 @@ from session.session_access import (
 )
 from depends import (
     create_dal,
+    create_read_only_dal,
     connection_count_inc
 )
 
@@ -71,7 +72,7 @@ async def user_login_handler(
     # https://github.com/encode/starlette/issues/425
 
     # match the token
-    client: Client | None = await dal.get_client_by_token(token=token)
+    client: Client | None = await request.app.state.client_cache.get(dal, token)
     if (client is None) or (not client.valid):
         return ErrorMessage(error_type="003", message="Illegal client.")
     locale_model = get_locale_model(client.locale)
@@ -317,7 +318,7 @@ async def user_update_password_handler(
 @router.post("/{user_identifier}/info")  # Get user info
 async def user_info_handler(
         user_identifier: str,
-        dal: DBAccessLayer = Depends(create_dal)
+        dal: DBAccessLayer = Depends(create_read_only_dal)
 ):
     user: User | None = await get_user_from_identifier(user_identifier=user_identifier, dal=dal)
     if user is None:
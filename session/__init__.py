@@ -1,2 +1,3 @@
 import session.models
+import session.signed_session
 import session.session_access
\ No newline at end of file
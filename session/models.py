@@ -1,6 +1,8 @@
 from pydantic import BaseModel as PydanticModel
 import json
 
+SESSION_EXPIRE: int = 60 * 60 * 24  # 1 day, of Redis sessions and signed session tokens
+
 
 class Session(PydanticModel):
     session_id: str
@@ -1,15 +1,45 @@
-from session.models import Session, deserialize_session
+from session.models import Session, deserialize_session, SESSION_EXPIRE
 from redis.asyncio import Redis
 from common import ClientType
 from time import time
+import json
 
 from locales import get_locale_model
+from cache.session import session_cache, SESSION_CACHE_CHANNEL
+from session.signed_session import session_signer, is_signed_token
+from config import SESSION_SIGNED
 
 '''
 session:{session_id} -> Session
 user:{user_id} -> session_id
+Not used by signed sessions, see session/signed_session.py.
 '''
 
+# KEYS[1]: user:{user_id}, KEYS[2]: session:{session_id}
+# ARGV[1]: session id, ARGV[2]: serialized session, ARGV[3]: expire, ARGV[4]: session cache channel
+# The previous session key is read from user:{user_id}, so this needs a single (non-cluster) Redis
+NEW_SESSION_SCRIPT = '''
+local previous = redis.call('GET', KEYS[1])
+if previous and previous ~= ARGV[1] then
+    redis.call('DEL', 'session:' .. previous)
+    redis.call('PUBLISH', ARGV[4], cjson.encode({previous}))
+end
+redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[3])
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+return previous
+'''
+
+new_session_script = None
+
+
+async def register_session_scripts(
+        redis: Redis
+):
+    # called once at startup, so logins only need EVALSHA
+    global new_session_script
+    new_session_script = redis.register_script(NEW_SESSION_SCRIPT)
+    await redis.script_load(NEW_SESSION_SCRIPT)
+
 
 def generate_session_id(user_id: int):
     return hex(int(f"{user_id}{str(int(time()))[2:]}")).upper()[2:]
@@ -24,6 +54,28 @@ async def new_session(
         locale: str,
         proxied: bool
 ) -> Session:
+    if SESSION_SIGNED:
+        # revoke the user's previous tokens, but not the new one issued in the same millisecond
+        issued_at = int(time() * 1000)
+        await session_signer.revoke(redis, user_id, issued_at)
+        return Session(
+            session_id=session_signer.sign(
+                username=username,
+                user_id=user_id,
+                mobile=mobile,
+                client_type=client_type.value,
+                locale=locale,
+                proxied=proxied,
+                issued_at=issued_at,
+                expire=SESSION_EXPIRE
+            ),
+            username=username,
+            user_id=user_id,
+            mobile=mobile,
+            client_type=client_type.value,
+            locale=locale,
+            proxied=proxied
+        )
     session = Session(
         session_id=generate_session_id(user_id),
         username=username,
@@ -33,22 +85,14 @@ async def new_session(
         locale=locale,
         proxied=proxied
     )
-    # Drop previous session
-    await drop_session_by_id(redis, await get_session_id_by_user_id(redis, user_id))
-    # Add new session
-    async with redis.pipeline(transaction=True) as pipe:
-        await pipe.set(
-            f"session:{session.session_id}",
-            session.serialize(),
-            ex=60 * 60 * 24  # 1 day
-        ).execute()
-    # Add user_id -> session_id
-    async with redis.pipeline(transaction=True) as pipe:
-        await pipe.set(
-            f"user:{user_id}",
-            session.session_id,
-            ex=60 * 60 * 24  # 1 day
-        ).execute()
+    # Drop previous session, add new session and user_id -> session_id atomically
+    previous_session_id = await new_session_script(
+        keys=[f"user:{user_id}", f"session:{session.session_id}"],
+        args=[session.session_id, session.serialize(), SESSION_EXPIRE, SESSION_CACHE_CHANNEL],
+        client=redis
+    )
+    if previous_session_id is not None:
+        session_cache.invalidate([previous_session_id.decode()])
     return session
 
 
@@ -56,26 +100,36 @@ async def get_session_by_id(
         redis: Redis,
         session_id: str
 ) -> Session | None:
+    if is_signed_token(session_id):
+        await session_signer.load(redis)
+        return session_signer.verify(session_id)
+    session = session_cache.get(session_id)
+    if session is not None:
+        return session
+    version = session_cache.version
     session_data = await redis.get(f"session:{session_id}")
     if session_data is None:
         return None
-    return deserialize_session(session_data.decode())
+    session = deserialize_session(session_data.decode())
+    session_cache.set(session_id, session, version)
+    return session
 
 
 async def drop_session_by_id(
         redis: Redis,
         session_id: str
 ) -> bool:
-    if (await redis.exists(f"session:{session_id}")):
-        async with redis.pipeline(transaction=True) as pipe:
-            await pipe.delete(f"session:{session_id}").execute()
+    if is_signed_token(session_id):
+        await session_signer.load(redis)
+        session = session_signer.verify(session_id)
+        if session is None:
+            return False
+        await session_signer.revoke(redis, session.user_id, int(time() * 1000) + 1)
         return True
-    else:
-        return False
-
+    session_cache.invalidate([session_id])
+    async with redis.pipeline(transaction=True) as pipe:
+        deleted, _ = await pipe.delete(f"session:{session_id}").publish(
+            SESSION_CACHE_CHANNEL, json.dumps([session_id])
+        ).execute()
+    return deleted > 0
 
-async def get_session_id_by_user_id(
-        redis: Redis,
-        user_id: int
-) -> str | None:
-    return await redis.get(f'user:{user_id}')
@@ -0,0 +1,155 @@
+import base64
+import hashlib
+import hmac
+import json
+import time
+
+from loguru import logger
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from config import SESSION_SIGNED, SESSION_SECRET
+from session.models import Session, SESSION_EXPIRE
+
+'''
+session:revocations -> sorted set of user_id scored by the time (ms) before which the user's tokens are revoked
+                       (entries older than SESSION_EXPIRE revoke only expired tokens, and are pruned on revoke)
+session:revocations:epoch -> time (ms) the revocations were created, tokens issued before it are all revoked
+                             (if Redis loses the key, it is created again and old tokens fail closed)
+(these replace the session:revoked hash of earlier versions, which is no longer read and can be deleted)
+session_revocation -> pub/sub channel of "{user_id}:{time}" revocations
+Signed session tokens are verified locally, Redis is only read again after a revocation was missed.
+'''
+
+SESSION_REVOCATION_CHANNEL: str = "session_revocation"
+SIGNATURE_SIZE: int = 16  # bytes of HMAC-SHA256 kept in tokens
+RELOAD_RETRY_INTERVAL: float = 5  # seconds between reloads of revocations while Redis is unavailable
+
+
+def b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+def b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+def revocation_cutoff() -> int:
+    # tokens revoked before this time (ms) have expired anyway
+    return int(time.time() * 1000) - SESSION_EXPIRE * 1000
+
+
+def is_signed_token(session_id: str) -> bool:
+    # session ids of Redis sessions are hexadecimal
+    return '.' in session_id
+
+
+class SessionSigner:
+    # issues and verifies "{payload}.{signature}" session tokens, where the payload carries the session fields
+    def __init__(self, secret: bytes | None):
+        # without a secret, no token is valid
+        self.secret = secret
+        # local mirror of session:revocations, user id -> revoked before (ms)
+        # in about the order of revocation, so expired revocations are pruned from the front
+        self.revocations: dict[int, int] = {}
+        # session:revocations:epoch, None until loaded, which rejects every token
+        self.epoch: int | None = None
+        self.loaded: bool = False
+        self.next_reload: float = 0
+
+    def signature(self, payload: str) -> bytes:
+        return hmac.new(self.secret, payload.encode(), hashlib.sha256).digest()[:SIGNATURE_SIZE]
+
+    def sign(self, username: str, user_id: int, mobile: bool, client_type: int, locale: str, proxied: bool,
+             issued_at: int, expire: int) -> str:
+        payload = b64encode(json.dumps(
+            [user_id, username, client_type, locale, int(mobile), int(proxied), issued_at, issued_at // 1000 + expire],
+            separators=(',', ':'),
+            ensure_ascii=False
+        ).encode())
+        return f"{payload}.{b64encode(self.signature(payload))}"
+
+    def verify(self, token: str) -> Session | None:
+        if self.secret is None or self.epoch is None:
+            return None
+        payload, _, signature = token.partition('.')
+        try:
+            if not hmac.compare_digest(b64decode(signature), self.signature(payload)):
+                return None
+            user_id, username, client_type, locale, mobile, proxied, issued_at, expires_at = json.loads(
+                b64decode(payload)
+            )
+        except ValueError:
+            return None
+        if expires_at < time.time() or issued_at < max(self.epoch, self.revocations.get(user_id, 0)):
+            return None
+        return Session(
+            session_id=token,
+            username=username,
+            user_id=user_id,
+            mobile=bool(mobile),
+            client_type=client_type,
+            locale=locale,
+            proxied=bool(proxied)
+        )
+
+    async def load(self, redis: Redis):
+        # reload all revocations, skipped for a while when Redis is unavailable
+        if self.loaded or time.monotonic() < self.next_reload:
+            return
+        self.loaded = True
+        try:
+            async with redis.pipeline(transaction=True) as pipe:
+                _, epoch, revocations = await pipe.set(
+                    "session:revocations:epoch", int(time.time() * 1000), nx=True
+                ).get("session:revocations:epoch").zrangebyscore(
+                    "session:revocations", revocation_cutoff(), "+inf", withscores=True
+                ).execute()
+        except RedisError as e:
+            logger.warning(f"Failed to load session revocations: {e}")
+            self.loaded = False
+            self.next_reload = time.monotonic() + RELOAD_RETRY_INTERVAL
+            return
+        epoch = int(epoch)
+        self.epoch = epoch if self.epoch is None else max(self.epoch, epoch)
+        for user_id, revoked_before in revocations:
+            self.set_revocation(int(user_id), int(revoked_before))
+
+    async def revoke(self, redis: Redis, user_id: int, revoked_before: int):
+        # revoke the user's tokens issued before revoked_before (ms)
+        self.set_revocation(user_id, revoked_before)
+        async with redis.pipeline(transaction=True) as pipe:
+            # new revocations must not accept tokens issued before they existed, see load
+            await pipe.set("session:revocations:epoch", revoked_before, nx=True).zadd(
+                "session:revocations", {user_id: revoked_before}
+            ).zremrangebyscore(
+                "session:revocations", "-inf", f"({revocation_cutoff()}"
+            ).publish(
+                SESSION_REVOCATION_CHANNEL, json.dumps([f"{user_id}:{revoked_before}"])
+            ).execute()
+
+    def set_revocation(self, user_id: int, revoked_before: int):
+        cutoff = revocation_cutoff()
+        if revoked_before >= cutoff and revoked_before > self.revocations.get(user_id, 0):
+            self.revocations.pop(user_id, None)
+            self.revocations[user_id] = revoked_before
+        while self.revocations:
+            oldest_user_id, oldest_revoked_before = next(iter(self.revocations.items()))
+            if oldest_revoked_before >= cutoff:
+                break
+            del self.revocations[oldest_user_id]
+
+    def revoked(self, revocations: list[str]):
+        for revocation in revocations:
+            user_id, revoked_before = revocation.split(':')
+            self.set_revocation(int(user_id), int(revoked_before))
+
+    def clear(self):
+        # revocations may have been missed, reload them on next verification
+        self.loaded = False
+
+
+if SESSION_SIGNED and not SESSION_SECRET:
+    # anyone could forge tokens with a key derived from the public default api_key
+    raise ValueError("session.secret must be set to enable signed sessions")
+session_signer = SessionSigner(SESSION_SECRET.encode() if SESSION_SECRET else None)
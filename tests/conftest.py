@@ -0,0 +1,133 @@
+# Run from the server directory:
+#   python -m pytest
+# Tests run against temporary SQLite databases and fakeredis, no servers are needed.
+# Needs pytest and fakeredis on top of requirements.txt.
+import datetime
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('ENGINETRIBE_CONFIG_PATH', os.path.join(ROOT, 'tests', 'config.yml'))
+# config.py reads config.default.yml from the working directory
+os.chdir(ROOT)
+sys.path.insert(0, ROOT)
+
+import fakeredis
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from database.db import Base, create_engine
+from database.db_access import DBAccessLayer
+from database.models import Level, User
+from cache.level import level_cache
+from cache.user_name import user_name_cache
+from cache.session import session_cache
+from session.models import Session
+from common import ClientType
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+@pytest.fixture(autouse=True)
+def clear_process_caches():
+    level_cache.clear()
+    user_name_cache.clear()
+    session_cache.clear()
+
+
+@pytest.fixture
+async def engine(tmp_path):
+    engine = create_engine(str(tmp_path / 'test.db'), 0)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield engine
+    await engine.dispose()
+
+
+@pytest.fixture
+def session_maker(engine):
+    return async_sessionmaker(engine, expire_on_commit=False)
+
+
+@pytest.fixture
+async def redis():
+    redis = fakeredis.FakeAsyncRedis()
+    yield redis
+    await redis.aclose()
+
+
+@pytest.fixture
+def make_dal(session_maker, redis):
+    def make_dal(**kwargs) -> DBAccessLayer:
+        return DBAccessLayer(session_maker=session_maker, redis=redis, **kwargs)
+    return make_dal
+
+
+@pytest.fixture
+def add_levels(session_maker):
+    # bulk insert levels, level i gets id i + 1 and level id "0000-0000-0000-{i:04d}"
+    async def add_levels(count: int, **values) -> list[str]:
+        rows = [
+            {
+                'id': i + 1, 'level_id': f'0000-0000-0000-{i:04d}', 'name': f'Level {i}',
+                'likes': 0, 'dislikes': 0, 'plays': 0, 'deaths': 0, 'clears': 0, 'score': 0,
+                'style': 0, 'environment': 0, 'tag_1': 0, 'tag_2': 0, 'description': '',
+                'date': datetime.date.today(), 'author_id': 1, 'non_latin': False, 'featured': False,
+                'record_user_id': 0, 'record': 0, 'testing_client': False
+            } | values for i in range(count)
+        ]
+        async with session_maker() as session:
+            async with session.begin():
+                await session.execute(insert(User), [{
+                    'id': 1, 'username': 'author', 'im_id': 1, 'password_hash': '', 'uploads': count,
+                    'is_admin': False, 'is_mod': False, 'is_booster': False, 'is_valid': True, 'is_banned': False
+                }])
+                await session.execute(insert(Level), rows)
+        return [row['level_id'] for row in rows]
+    return add_levels
+
+
+@pytest.fixture
+def game_session() -> Session:
+    return Session(session_id='0', username='player', user_id=2, mobile=False,
+                   client_type=ClientType.STABLE.value, locale='ES', proxied=False)
+
+
+@pytest.fixture
+def app_request(redis):
+    # the parts of a FastAPI request the handlers use
+    return SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace(
+        redis=redis,
+        storage=SimpleNamespace(generate_url=lambda level_id: f'http://storage/{level_id}'),
+        counter_buffer=None,
+        group_commit_writer=None
+    )))
+
+
+SEARCH_FORM_FIELDS: tuple[str, ...] = (
+    'featured', 'title', 'author', 'aparience', 'entorno', 'last', 'sort', 'liked', 'disliked',
+    'historial', 'dificultad', 'rows_perpage', 'tags', 'cursor', 'estimate'
+)
+
+
+@pytest.fixture
+def detailed_search(app_request, make_dal, game_session):
+    # the detailed search handler with unset form fields, as FastAPI would call it
+    from routers.stage import stages_detailed_search_handler
+
+    async def detailed_search(page: str = '1', session: Session = game_session, **form):
+        dal = make_dal(read_only=True)
+        try:
+            return await stages_detailed_search_handler(
+                request=app_request, page=page, dal=dal, auth_code=session.session_id, session=session,
+                **({field: None for field in SEARCH_FORM_FIELDS} | form)
+            )
+        finally:
+            await dal.close()
+    return detailed_search
@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from cache.level import level_cache, LEVEL_CACHE_CHANNEL
+from cache.user_name import user_name_cache
+from cache.pubsub import listen_invalidations, publish_invalidation
+
+pytestmark = pytest.mark.anyio
+
+
+async def wait_for(condition):
+    for _ in range(200):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError('condition not met')
+
+
+@pytest.fixture
+async def listener(redis):
+    # another worker's view of the invalidations, recorded instead of applied
+    calls: list = []
+    task = asyncio.create_task(listen_invalidations(
+        redis, 'test:invalidate', lambda keys: calls.append(keys), lambda: calls.append('reset')
+    ))
+    await wait_for(lambda: calls == ['reset'])  # subscribed
+    yield calls
+    task.cancel()
+
+
+async def test_invalidations_are_delivered(listener, redis):
+    await publish_invalidation(redis, 'test:invalidate', ['a', 'b'])
+    await wait_for(lambda: len(listener) == 2)
+    assert listener == ['reset', ['a', 'b']]
+
+
+@pytest.mark.parametrize('data', [b'not json', b'\xff\xfe', b'{"a": 1}', b'42'])
+async def test_malformed_invalidations_reset_the_cache(listener, redis, data):
+    await redis.publish('test:invalidate', data)
+    await wait_for(lambda: len(listener) == 2)
+    assert listener[1] == 'reset'
+    # still listening
+    await publish_invalidation(redis, 'test:invalidate', ['a'])
+    await wait_for(lambda: len(listener) == 3)
+    assert listener[2] == ['a']
+
+
+async def test_level_writes_are_published(add_levels, make_dal, redis):
+    [level_id] = await add_levels(1)
+    pubsub = redis.pubsub(ignore_subscribe_messages=True)
+    await pubsub.subscribe(LEVEL_CACHE_CHANNEL)
+    dal = make_dal()
+    try:
+        await dal.add_play_to_level(level_id)
+        await dal.commit()
+    finally:
+        await dal.close()
+    message = None
+    for _ in range(10):
+        # None for the skipped subscribe confirmation
+        message = message or await pubsub.get_message(timeout=0.1)
+    assert message['data'] == f'["{level_id}"]'.encode()
+    await pubsub.aclose()
+
+
+async def test_published_levels_leave_the_level_cache(add_levels, make_dal, redis):
+    [level_id] = await add_levels(1)
+    dal = make_dal(read_only=True)
+    try:
+        await dal.get_level_by_level_id(level_id)
+    finally:
+        await dal.close()
+    assert level_cache.get(level_id) is not None
+    task = asyncio.create_task(listen_invalidations(redis, LEVEL_CACHE_CHANNEL, level_cache.invalidate, lambda: None))
+    await asyncio.sleep(0.05)
+    await publish_invalidation(redis, LEVEL_CACHE_CHANNEL, [level_id])
+    await wait_for(lambda: level_id not in level_cache.entries)
+    task.cancel()
+
+
+async def test_replica_reads_are_not_cached(add_levels, make_dal, redis):
+    [level_id] = await add_levels(1)
+    dal = make_dal(read_only=True, replica=True)
+    try:
+        assert (await dal.get_level_by_level_id(level_id)).level_id == level_id
+        # user 2 may only be missing from a lagging replica
+        assert await dal.get_user_names_by_ids([1, 2]) == {1: 'author'}
+    finally:
+        await dal.close()
+    assert level_cache.get(level_id) is None
+    assert not user_name_cache.entries
+    assert await redis.hgetall('user_names') == {}
@@ -0,0 +1,58 @@
+import fakeredis
+import pytest
+
+from cache.catalog import (
+    filter_signature,
+    get_catalog_version,
+    bump_catalog_version,
+    get_cached_level_count,
+    set_cached_level_count
+)
+
+pytestmark = pytest.mark.anyio
+
+
+def test_filter_signature_ignores_order_and_unset_filters():
+    assert filter_signature(sort='antiguos', featured=None, aparience=1) == \
+           filter_signature(aparience=1, sort='antiguos')
+
+
+async def test_counts_are_cached_per_catalog_version(redis):
+    version = await get_catalog_version(redis)
+    await set_cached_level_count(redis, version, 'featured=promising', 10)
+    assert await get_cached_level_count(redis, version, 'featured=promising') == 10
+    assert await bump_catalog_version(redis) == version + 1
+    assert await get_cached_level_count(redis, await get_catalog_version(redis), 'featured=promising') is None
+
+
+async def test_listing_count_is_recounted_after_version_bump(detailed_search, app_request, make_dal, add_levels):
+    await add_levels(3)
+    results = await detailed_search(sort='antiguos')
+    assert results.num_rows == 3
+    # a level deleted without bumping the version is still counted, as in the cache
+    dal = make_dal()
+    await dal.delete_level(await dal.get_level_by_level_id('0000-0000-0000-0000'))
+    await dal.commit()
+    await dal.close()
+    results = await detailed_search(sort='antiguos')
+    assert results.num_rows == 3
+    await bump_catalog_version(app_request.app.state.redis)
+    results = await detailed_search(sort='antiguos')
+    assert results.num_rows == 2
+    assert [level.id for level in results.result] == ['0000-0000-0000-0001', '0000-0000-0000-0002']
+
+
+async def test_per_user_listings_are_not_cached(detailed_search, add_levels, redis):
+    await add_levels(3)
+    await detailed_search(title='Level')
+    assert await redis.keys('count:*') == []
+
+
+async def test_search_falls_through_to_the_database_without_redis(detailed_search, app_request, add_levels):
+    await add_levels(3)
+    server = fakeredis.FakeServer()
+    server.connected = False
+    app_request.app.state.redis = fakeredis.FakeAsyncRedis(server=server)
+    results = await detailed_search(sort='antiguos')
+    assert results.num_rows == 3
+    assert await bump_catalog_version(app_request.app.state.redis) is None
@@ -0,0 +1,80 @@
+from types import SimpleNamespace
+
+import pytest
+
+from database.counter_buffer import CounterBuffer, flush_keys
+from database.db_access import DBAccessLayer
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def counter_buffer(redis, session_maker) -> CounterBuffer:
+    return CounterBuffer(redis=redis, database=SimpleNamespace(async_session=session_maker), flush_interval=1)
+
+
+async def get_level(session_maker, level_data_id: int = 1):
+    async with session_maker() as session:
+        return await DBAccessLayer(session).get_level_by_id(level_data_id)
+
+
+async def test_increments_are_counted_live_and_flushed(counter_buffer, add_levels, session_maker, redis):
+    await add_levels(1, plays=98)
+    level = await get_level(session_maker)
+    assert [await counter_buffer.incr(level, 'plays') for _ in range(3)] == [99, 100, 101]
+    await counter_buffer.incr(level, 'likes', 2)
+    await counter_buffer.incr(level, 'dislikes')
+    assert (await get_level(session_maker)).plays == 98
+    await counter_buffer.flush()
+    level = await get_level(session_maker)
+    assert (level.plays, level.likes, level.dislikes, level.score) == (101, 2, 1, 1)
+    assert await redis.exists("counter:pending", "counter:flushes") == 0
+    # nothing left to write twice
+    await counter_buffer.flush()
+    assert (await get_level(session_maker)).plays == 101
+
+
+async def test_failed_flush_hands_increments_back(counter_buffer, add_levels, session_maker, redis):
+    await add_levels(1)
+    await counter_buffer.incr(await get_level(session_maker), 'clears')
+
+    def broken_session():
+        raise ConnectionError('database is down')
+    counter_buffer.db = SimpleNamespace(async_session=broken_session)
+    await counter_buffer.flush()
+    assert await redis.hgetall("counter:pending") == {b'1:clears': b'1'}
+    assert await redis.scard("counter:flushes") == 0
+
+    counter_buffer.db = SimpleNamespace(async_session=session_maker)
+    await counter_buffer.flush()
+    assert (await get_level(session_maker)).clears == 1
+
+
+async def test_interrupted_flush_is_recovered_after_its_lease(counter_buffer, add_levels, session_maker, redis):
+    await add_levels(1)
+    await counter_buffer.incr(await get_level(session_maker), 'deaths', 5)
+    # a worker took the pending increments and died before writing them
+    pending, flushing_key, lease_key, flushes_key = flush_keys('dead')
+    await counter_buffer.take_pending_script(keys=flush_keys('dead'), args=['dead', 60])
+    await counter_buffer.incr(await get_level(session_maker), 'deaths', 1)
+
+    await counter_buffer.recover()
+    assert await redis.exists(flushing_key) == 1  # still within the lease, the worker may be writing
+    await redis.delete(lease_key)
+    await counter_buffer.recover()
+    assert await redis.exists(flushing_key) == 0
+    assert await redis.hgetall(pending) == {b'1:deaths': b'6'}
+
+    await counter_buffer.flush()
+    assert (await get_level(session_maker)).deaths == 6
+
+
+async def test_unregistered_flushing_keys_are_recovered_at_startup(counter_buffer, add_levels, session_maker, redis):
+    await add_levels(1)
+    await redis.hset("counter:flushing:old", "1:plays", 3)
+    await counter_buffer.recover()
+    assert await redis.exists("counter:flushing:old") == 1
+    await counter_buffer.recover(scan=True)
+    assert await redis.exists("counter:flushing:old") == 0
+    await counter_buffer.flush()
+    assert (await get_level(session_maker)).plays == 3
@@ -0,0 +1,106 @@
+import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from cache.search import search_cache_stats
+from config import ROWS_PERPAGE
+from database.db_access import DBAccessLayer
+from models import DetailedSearchResults, ErrorMessage
+
+pytestmark = pytest.mark.anyio
+
+
+async def walk_cursors(detailed_search, **form) -> list[str]:
+    # level ids of all pages, following next_cursor
+    level_ids: list[str] = []
+    cursor: str | None = None
+    while True:
+        results = await detailed_search(cursor=cursor, **form)
+        level_ids += [level.id for level in results.result]
+        cursor = results.next_cursor
+        if cursor is None:
+            return level_ids
+
+
+async def test_cursor_pages_match_offset_pages(detailed_search, add_levels):
+    await add_levels(ROWS_PERPAGE * 2 + 5)
+    by_page: list[str] = []
+    for page in range(1, 4):
+        results = await detailed_search(page=str(page))
+        by_page += [level.id for level in results.result]
+    by_cursor = await walk_cursors(detailed_search)
+    assert by_cursor == by_page
+    assert len(set(by_cursor)) == ROWS_PERPAGE * 2 + 5
+
+
+async def test_latest_is_descending_and_antiguos_ascending(detailed_search, add_levels):
+    level_ids = await add_levels(ROWS_PERPAGE + 3)
+    assert await walk_cursors(detailed_search) == level_ids[::-1]
+    assert await walk_cursors(detailed_search, sort='antiguos') == level_ids
+    first_page = await detailed_search(sort='antiguos')
+    assert [level.id for level in first_page.result] == level_ids[:ROWS_PERPAGE]
+
+
+async def test_cursor_of_popular_listing_breaks_score_ties_by_id(
+        detailed_search, add_levels, session_maker
+):
+    await add_levels(ROWS_PERPAGE + 10)
+    async with session_maker() as session:
+        async with session.begin():
+            dal = DBAccessLayer(session)
+            for level_id in ('0000-0000-0000-0003', '0000-0000-0000-0007'):
+                await dal.increment_level_counters(level_id, {'likes': 1})
+    level_ids = await walk_cursors(detailed_search, featured='popular')
+    assert level_ids[:2] == ['0000-0000-0000-0007', '0000-0000-0000-0003']
+    assert len(level_ids) == len(set(level_ids)) == ROWS_PERPAGE + 10
+
+
+async def test_last_page_has_no_cursor(detailed_search, add_levels):
+    await add_levels(3)
+    results = await detailed_search()
+    assert isinstance(results, DetailedSearchResults)
+    assert results.next_cursor is None
+
+
+async def test_malformed_cursor_is_rejected(detailed_search, add_levels):
+    await add_levels(3)
+    results = await detailed_search(cursor='abc')
+    assert isinstance(results, ErrorMessage)
+
+
+async def test_cached_page_carries_each_users_flags(detailed_search, add_levels, make_dal, game_session):
+    level_ids = await add_levels(3)
+    other_user = game_session.model_copy(update={'user_id': 3})
+    dal = make_dal()
+    try:
+        await dal.add_like_to_level(3, level_ids[0])
+        await dal.add_clear_to_level(3, level_ids[1], record=100)
+        await dal.commit()
+    finally:
+        await dal.close()
+    first = await detailed_search(sort='antiguos')
+    hits: int = search_cache_stats['hits']
+    second = await detailed_search(sort='antiguos', session=other_user)
+    assert search_cache_stats['hits'] == hits + 1
+    assert [(level.user_data.liked, level.user_data.completed) for level in first.result] == [
+        ('3', 'no'), ('3', 'no'), ('3', 'no')
+    ]
+    assert [(level.user_data.liked, level.user_data.completed) for level in second.result] == [
+        ('0', 'no'), ('3', 'yes'), ('3', 'no')
+    ]
+
+
+async def test_page_cache_errors_fall_through_to_the_database(detailed_search, add_levels, redis, monkeypatch):
+    await add_levels(3)
+    get, set = redis.get, redis.set
+
+    def failing(command):
+        async def call(key, *args, **kwargs):
+            if key.startswith('search:'):
+                raise RedisConnectionError('Redis is down')
+            return await command(key, *args, **kwargs)
+        return call
+    monkeypatch.setattr(redis, 'get', failing(get))
+    monkeypatch.setattr(redis, 'set', failing(set))
+    for _ in range(2):
+        results = await detailed_search(sort='antiguos')
+        assert results.num_rows == 3
@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+from sqlalchemy import select, func
+
+import database.db_access
+from database.db import create_engine
+from database.group_commit import GroupCommitWriter
+from database.models import ClearedUsers
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def writer(engine, redis):
+    writer = GroupCommitWriter(redis=redis, window=0.01, engine=create_engine(engine.url.database, 0))
+    writer.start()
+    yield writer
+    if not writer.closed:
+        await writer.close()
+
+
+async def play(make_dal, writer, level_id: str):
+    dal = make_dal(writer=writer)
+    try:
+        level = await dal.add_play_to_level(level_id)
+        await dal.commit()
+        return level.plays
+    finally:
+        await dal.close()
+
+
+async def test_parallel_writes_share_commits(writer, add_levels, make_dal):
+    [level_id] = await add_levels(1)
+    plays = await asyncio.gather(*(play(make_dal, writer, level_id) for _ in range(200)))
+    assert sorted(plays) == list(range(1, 201))
+    assert writer.stats['writes'] == 200
+    assert writer.stats['commits'] < 200
+
+
+async def test_close_writes_queued_writes(writer, add_levels, make_dal, session_maker):
+    [level_id] = await add_levels(1)
+    plays = [asyncio.create_task(play(make_dal, writer, level_id)) for _ in range(20)]
+    await asyncio.sleep(0)
+    await writer.close()
+    assert sorted(await asyncio.gather(*plays)) == list(range(1, 21))
+    with pytest.raises(RuntimeError):
+        await play(make_dal, writer, level_id)
+
+
+async def test_clear_and_record_are_one_write(writer, add_levels, make_dal, app_request, game_session,
+                                              session_maker):
+    from routers.stage import stats_victorias_handler
+    [level_id] = await add_levels(1)
+    app_request.app.state.group_commit_writer = writer
+    dal = make_dal(writer=writer)
+    try:
+        await stats_victorias_handler(request=app_request, level_id=level_id, tiempo='500', dal=dal,
+                                      auth_code=game_session.session_id, session=game_session)
+    finally:
+        await dal.close()
+    assert writer.stats['writes'] == 1
+    read_dal = make_dal(read_only=True)
+    try:
+        level = await read_dal.get_level_by_level_id(level_id)
+        assert (level.clears, level.record, level.record_user_id) == (1, 500, game_session.user_id)
+        assert await read_dal.get_clear_type(level, game_session.user_id) == 'yes'
+    finally:
+        await read_dal.close()
+    async with session_maker() as session:
+        assert (await session.execute(select(func.count()).select_from(ClearedUsers))).scalar() == 1
+
+
+async def test_writes_keep_the_user_on_the_primary(writer, add_levels, make_dal, redis, monkeypatch):
+    monkeypatch.setattr(database.db_access, 'DATABASE_REPLICAS', [{'host': 'replica'}])
+    [level_id] = await add_levels(1)
+    dal = make_dal(writer=writer, user_id=2)
+    try:
+        await dal.add_play_to_level(level_id)
+        await dal.commit()
+    finally:
+        await dal.close()
+    assert await redis.exists("replica:sticky:2") == 1
+
+
+async def test_lone_writes_skip_the_window(engine, redis, add_levels, make_dal):
+    [level_id] = await add_levels(1)
+    writer = GroupCommitWriter(redis=redis, window=5, engine=create_engine(engine.url.database, 0))
+    writer.start()
+    try:
+        assert await asyncio.wait_for(play(make_dal, writer, level_id), 2) == 1
+    finally:
+        await writer.close()
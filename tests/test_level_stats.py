@@ -0,0 +1,32 @@
+import asyncio
+
+import pytest
+
+from database.db_access import DBAccessLayer
+
+pytestmark = pytest.mark.anyio
+
+PARALLEL_PLAYS: int = 1000
+
+
+@pytest.mark.parametrize('update_returning', [True, False], ids=['returning', 'emulated'])
+async def test_parallel_plays_are_not_lost(update_returning, engine, add_levels, make_dal, session_maker,
+                                           monkeypatch):
+    # the emulated path is the one MySQL takes, UPDATE then SELECT in the same transaction
+    monkeypatch.setattr(engine.sync_engine.dialect, 'update_returning', update_returning)
+    [level_id] = await add_levels(1)
+
+    async def play() -> int:
+        dal = make_dal()
+        try:
+            level = await dal.add_play_to_level(level_id)
+            await dal.commit()
+            return level.plays
+        finally:
+            await dal.close()
+
+    plays = await asyncio.gather(*(play() for _ in range(PARALLEL_PLAYS)))
+    # every request saw its own increment, so the 100 and 1000 milestones fire exactly once
+    assert sorted(plays) == list(range(1, PARALLEL_PLAYS + 1))
+    async with session_maker() as session:
+        assert (await DBAccessLayer(session).get_level_by_id(1)).plays == PARALLEL_PLAYS
@@ -0,0 +1,51 @@
+import asyncio
+from collections import deque
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import update
+
+from database.models import Level
+from database.random_pool import RandomLevelPool, POOL_SIZE
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def random_pool(session_maker) -> RandomLevelPool:
+    return RandomLevelPool(SimpleNamespace(read_session=lambda: session_maker))
+
+
+async def test_refill_samples_a_bounded_number_of_levels(random_pool, add_levels, session_maker):
+    await add_levels(3 * POOL_SIZE, difficulty=1)
+    async with session_maker() as session:
+        async with session.begin():
+            await session.execute(update(Level).where(Level.id % 3 == 0).values(difficulty=2))
+    assert random_pool.pop(1, False) is None
+    assert len(random_pool.tasks) == 1  # referenced until it finishes
+    await asyncio.gather(*random_pool.tasks)
+    assert not random_pool.tasks
+    level_ids = random_pool.pools[(1, False)]
+    assert 0 < len(level_ids) <= POOL_SIZE
+    assert len(set(level_ids)) == len(level_ids)
+    assert all(level_id % 3 != 0 for level_id in level_ids)
+
+
+async def test_stale_pooled_levels_are_skipped(random_pool, add_levels, session_maker, app_request, make_dal,
+                                               game_session):
+    from routers.stage import stage_id_random_handler
+    await add_levels(2, difficulty=2)
+    async with session_maker() as session:
+        async with session.begin():
+            # level 1 moved to another difficulty after the pool was filled
+            await session.execute(update(Level).where(Level.id == 1).values(difficulty=3))
+    random_pool.pools[(2, False)] = deque([1] * 200)
+    app_request.app.state.random_pool = random_pool
+    dal = make_dal(read_only=True)
+    try:
+        result = await stage_id_random_handler(
+            request=app_request, dificultad='2', dal=dal, auth_code=game_session.session_id, session=game_session
+        )
+    finally:
+        await dal.close()
+    assert result.result.id == '0000-0000-0000-0001'
@@ -0,0 +1,71 @@
+import pytest
+from sqlalchemy import text, select
+
+from database.db import missing_schema
+from database.migrate import explain_main_queries, add_missing_columns, backfill_columns, create_missing_indexes
+from database.db_access import DBAccessLayer
+from database.models import Level
+
+pytestmark = pytest.mark.anyio
+
+
+async def drop_column(engine, column: str):
+    # the level table as it was before the column existed
+    async with engine.begin() as conn:
+        for index in Level.__table__.indexes:
+            if column in index.columns:
+                await conn.execute(text(f'DROP INDEX {index.name}'))
+        await conn.execute(text(f'ALTER TABLE level_table DROP COLUMN {column}'))
+
+
+async def migrate_columns(engine):
+    async with engine.begin() as conn:
+        assert await conn.run_sync(missing_schema) != []
+        await conn.run_sync(add_missing_columns)
+        assert await conn.run_sync(missing_schema) == []
+    await backfill_columns(engine)
+
+
+async def test_difficulty_is_filled_when_the_column_is_added(engine, add_levels, session_maker, detailed_search):
+    await drop_column(engine, 'difficulty')
+    await add_levels(3, plays=10, clears=5)
+    await migrate_columns(engine)
+    async with session_maker() as session:
+        assert (await session.execute(select(Level.difficulty))).scalars().all() == [0, 0, 0]
+    results = await detailed_search(dificultad='0')
+    assert results.num_rows == 3
+
+
+async def test_score_is_filled_when_the_column_is_added(engine, add_levels, session_maker):
+    await add_levels(2, likes=7, dislikes=2)
+    await drop_column(engine, 'score')
+    await migrate_columns(engine)
+    async with session_maker() as session:
+        assert (await session.execute(select(Level.score))).scalars().all() == [5, 5]
+
+
+async def test_missing_score_is_recomputed_on_update(add_levels, session_maker):
+    await add_levels(2, likes=7, dislikes=2, score=None)
+    async with session_maker() as session:
+        async with session.begin():
+            dal = DBAccessLayer(session)
+            await dal.increment_level_counters('0000-0000-0000-0000', {'likes': 1})
+            await dal.apply_counter_increments([{'id': 2, 'dislikes': 3}])
+        assert (await session.execute(select(Level.score).order_by(Level.id))).scalars().all() == [6, 2]
+
+
+async def test_plans_before_migration_tolerate_missing_columns(engine):
+    await drop_column(engine, 'difficulty')
+    async with engine.connect() as conn:
+        plans = await conn.run_sync(explain_main_queries)
+    assert plans['levels by difficulty'][0].startswith('failed: OperationalError')
+    assert not plans['user by username'][0].startswith('failed')
+
+
+async def test_missing_unique_vote_indexes_are_reported(engine):
+    # repeated clears would be stored while the index is missing, so the server must not start
+    async with engine.begin() as conn:
+        await conn.execute(text('DROP INDEX uq_clears_table_parent_id_user_id'))
+        assert await conn.run_sync(missing_schema) == ['index uq_clears_table_parent_id_user_id']
+        await conn.run_sync(create_missing_indexes)
+        assert await conn.run_sync(missing_schema) == []
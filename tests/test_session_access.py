@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+import session.session_access
+from cache.pubsub import listen_invalidations
+from cache.session import SessionCache, session_cache, SESSION_CACHE_CHANNEL
+from common import ClientType
+from session.session_access import register_session_scripts, new_session, get_session_by_id, drop_session_by_id
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def scripts(redis):
+    await register_session_scripts(redis)
+
+
+async def login(redis, monkeypatch, now: int):
+    # session ids come from the login time in seconds, so each login gets its own second
+    monkeypatch.setattr(session.session_access, 'time', lambda: now)
+    return await new_session(redis, username='player', user_id=2, mobile=False, client_type=ClientType.STABLE,
+                             locale='ES', proxied=False)
+
+
+async def wait_for(condition):
+    for _ in range(200):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError('condition not met')
+
+
+async def test_login_drops_the_previous_session(scripts, redis, monkeypatch):
+    old = await login(redis, monkeypatch, 1_700_000_000)
+    assert (await get_session_by_id(redis, old.session_id)).user_id == 2
+    assert old.session_id in session_cache.entries
+    new = await login(redis, monkeypatch, 1_700_000_001)
+    assert new.session_id != old.session_id
+    assert old.session_id not in session_cache.entries
+    assert await get_session_by_id(redis, old.session_id) is None
+    assert (await get_session_by_id(redis, new.session_id)).user_id == 2
+    assert await redis.get('user:2') == new.session_id.encode()
+
+
+async def test_login_evicts_the_previous_session_from_other_workers(scripts, redis, monkeypatch):
+    old = await login(redis, monkeypatch, 1_700_000_000)
+    # another worker that read the old session before the new login
+    other_cache = SessionCache(max_size=16, ttl=60)
+    task = asyncio.create_task(listen_invalidations(
+        redis, SESSION_CACHE_CHANNEL, other_cache.invalidate, other_cache.clear
+    ))
+    await wait_for(lambda: other_cache.version == 1)  # subscribed
+    other_cache.set(old.session_id, old, other_cache.version)
+    await login(redis, monkeypatch, 1_700_000_001)
+    await wait_for(lambda: old.session_id not in other_cache.entries)
+    task.cancel()
+
+
+async def test_drop_invalidates_the_session(scripts, redis, monkeypatch):
+    current = await login(redis, monkeypatch, 1_700_000_000)
+    assert await get_session_by_id(redis, current.session_id) is not None
+    other_cache = SessionCache(max_size=16, ttl=60)
+    task = asyncio.create_task(listen_invalidations(
+        redis, SESSION_CACHE_CHANNEL, other_cache.invalidate, other_cache.clear
+    ))
+    await wait_for(lambda: other_cache.version == 1)
+    other_cache.set(current.session_id, current, other_cache.version)
+    assert await drop_session_by_id(redis, current.session_id)
+    assert current.session_id not in session_cache.entries
+    assert await get_session_by_id(redis, current.session_id) is None
+    await wait_for(lambda: current.session_id not in other_cache.entries)
+    task.cancel()
+    assert not await drop_session_by_id(redis, current.session_id)
@@ -0,0 +1,91 @@
+import subprocess
+import sys
+import time
+
+import pytest
+
+from session.models import SESSION_EXPIRE
+from session.signed_session import SessionSigner
+
+pytestmark = pytest.mark.anyio
+
+
+def sign(signer: SessionSigner, issued_at: int, user_id: int = 2) -> str:
+    return signer.sign(username='player', user_id=user_id, mobile=False, client_type=0, locale='ES', proxied=False,
+                       issued_at=issued_at, expire=3600)
+
+
+def now() -> int:
+    return int(time.time() * 1000)
+
+
+async def test_tokens_are_rejected_until_revocations_are_loaded(redis):
+    signer = SessionSigner(b'secret')
+    # issued like new_session does
+    issued_at = now()
+    await signer.revoke(redis, 2, issued_at)
+    token = sign(signer, issued_at)
+    assert signer.verify(token) is None
+    await signer.load(redis)
+    assert signer.verify(token).user_id == 2
+    payload, _, signature = token.partition('.')
+    tampered = signature[:4] + ('A' if signature[4] != 'A' else 'B') + signature[5:]
+    assert signer.verify(f'{payload}.{tampered}') is None
+
+
+async def test_login_revokes_older_tokens(redis):
+    signer = SessionSigner(b'secret')
+    await signer.load(redis)
+    old_token = sign(signer, now())
+    other_user_token = sign(signer, now(), user_id=3)
+    time.sleep(0.002)
+    issued_at = now()
+    # a login on another worker, learnt from session:revoked
+    await SessionSigner(b'secret').revoke(redis, 2, issued_at)
+    signer.clear()
+    await signer.load(redis)
+    assert signer.verify(old_token) is None
+    assert signer.verify(sign(signer, issued_at)) is not None
+    assert signer.verify(other_user_token) is not None
+
+
+async def test_tokens_fail_closed_when_revocations_are_lost(redis):
+    signer = SessionSigner(b'secret')
+    await signer.load(redis)
+    token = sign(signer, now())
+    time.sleep(0.002)
+    await redis.delete("session:revocations", "session:revocations:epoch")
+    # the lost subscription makes workers reload
+    signer.clear()
+    await signer.load(redis)
+    assert signer.verify(token) is None
+    assert signer.verify(sign(signer, now())) is not None
+
+
+async def test_expired_revocations_are_pruned(redis):
+    signer = SessionSigner(b'secret')
+    expired = now() - SESSION_EXPIRE * 1000 - 1
+    await redis.zadd("session:revocations", {3: expired})
+    await signer.load(redis)
+    assert 3 not in signer.revocations
+    await signer.revoke(redis, 2, now())
+    assert await redis.zrange("session:revocations", 0, -1) == [b'2']
+    # learnt from the revocation channel
+    signer.revoked([f'4:{expired}', f'5:{now()}'])
+    assert list(signer.revocations) == [2, 5]
+
+
+async def test_no_token_is_valid_without_a_secret(redis):
+    signer = SessionSigner(None)
+    await signer.load(redis)
+    assert signer.verify(sign(SessionSigner(b''), now())) is None
+
+
+def test_signed_sessions_need_a_secret(tmp_path):
+    config = tmp_path / 'config.yml'
+    config.write_text("database:\n  adapter: 'sqlite'\nsession:\n  signed: true\n  secret: ''\n")
+    result = subprocess.run(
+        [sys.executable, '-c', 'import session.signed_session'],
+        env={'ENGINETRIBE_CONFIG_PATH': str(config), 'PATH': ''}, capture_output=True, text=True
+    )
+    assert 'session.secret must be set' in result.stderr
@@ -0,0 +1,72 @@
+import pytest
+from sqlalchemy import select, func
+
+from database.db import Base
+from database.migrate import index_missing_titles
+from database.db_access import DBAccessLayer
+from database.models import Level, LevelNameGram
+from database.search import title_grams, title_query_grams
+
+pytestmark = pytest.mark.anyio
+
+NAMES: tuple[str, ...] = (
+    'Super Mario World', '100% pure speedrun', 'a_b test', 'aXb test', 'Café Mario', 'CAFE MARIO',
+    '马里奥世界', '超级马里奥', 'ＡＢＣ full width', 'Überwelt', 'uberwelt 2'
+)
+QUERIES: tuple[str, ...] = (
+    'mario', 'MARIO', '100%', '0% p', '%', 'a_b', '_b ', 'café', 'cafe', '马里奥', '里奥世界', 'ABC', 'über',
+    'uber', 'welt', 'nothing'
+)
+
+
+def test_grams_ignore_case_and_accents():
+    assert title_grams('Café') == title_grams('CAFE') == {'caf', 'afe'}
+    assert title_grams('Über') == title_grams('uber')
+    assert title_grams('马里奥世界') == {'马里奥', '里奥世', '奥世界'}
+    assert title_grams('ab') == set()
+
+
+def test_query_grams_cover_every_character():
+    assert title_query_grams('abcdefgh') == {'abc', 'def', 'fgh'}
+    assert title_query_grams('abcdef') == {'abc', 'def'}
+    assert title_query_grams('abc') == {'abc'}
+    assert title_query_grams('ab') == set()
+
+
+async def test_index_agrees_with_like(add_levels, session_maker):
+    await add_levels(len(NAMES))
+    async with session_maker() as session:
+        async with session.begin():
+            dal = DBAccessLayer(session)
+            for level_id, name in zip(range(1, len(NAMES) + 1), NAMES):
+                level = await dal.get_level_by_id(level_id)
+                await dal.delete_level(level)
+                await dal.add_level(name=name, style=0, environment=0, tag_1=0, tag_2=0, author_id=1,
+                                    level_id=f'1000-0000-0000-{level_id:04d}', non_latin=False,
+                                    testing_client=False, description='')
+        dal = DBAccessLayer(session)
+        for query in QUERIES:
+            by_index = set(await dal.execute_selection(select(Level.name).where(dal.title_contains(query))))
+            by_like = set(await dal.execute_selection(
+                select(Level.name).where(Level.name.contains(query, autoescape=True))
+            ))
+            assert by_index == by_like, query
+        # wildcards are literal characters
+        assert await dal.execute_selection(select(Level.name).where(dal.title_contains('%'))) == ['100% pure speedrun']
+        assert await dal.execute_selection(select(Level.name).where(dal.title_contains('a_b'))) == ['a_b test']
+
+
+async def test_existing_levels_are_indexed_by_the_migration(engine, add_levels, session_maker):
+    async with engine.begin() as conn:
+        await conn.run_sync(LevelNameGram.__table__.drop)
+    await add_levels(5)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    await index_missing_titles(engine)
+    await index_missing_titles(engine)  # nothing left to index
+    async with session_maker() as session:
+        dal = DBAccessLayer(session)
+        assert (await session.execute(select(func.count()).select_from(LevelNameGram))).scalar() > 0
+        assert await dal.execute_selection(select(Level.level_id).where(dal.title_contains('Level 3'))) == [
+            '0000-0000-0000-0003'
+        ]
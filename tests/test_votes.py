@@ -0,0 +1,55 @@
+import pytest
+from sqlalchemy import select, func
+
+from database.models import LikeUsers, DislikeUsers, ClearedUsers
+
+pytestmark = pytest.mark.anyio
+
+
+async def vote(make_dal, like: bool, level_id: str, user_id: int = 2):
+    dal = make_dal()
+    try:
+        if like:
+            level, new = await dal.add_like_to_level(user_id, level_id)
+        else:
+            level, new = await dal.add_dislike_to_level(user_id, level_id)
+        await dal.commit()
+        return (level.likes, level.dislikes), new
+    finally:
+        await dal.close()
+
+
+async def count_rows(session_maker, model) -> int:
+    async with session_maker() as session:
+        return (await session.execute(select(func.count()).select_from(model))).scalar()
+
+
+async def test_votes_switch_and_repeat(add_levels, make_dal, session_maker):
+    [level_id] = await add_levels(1)
+    assert await vote(make_dal, True, level_id) == ((1, 0), True)
+    assert await vote(make_dal, True, level_id) == ((1, 0), False)  # repeated like
+    assert await vote(make_dal, False, level_id) == ((0, 1), True)  # switched to a dislike
+    assert await vote(make_dal, False, level_id) == ((0, 1), False)
+    assert await vote(make_dal, True, level_id, user_id=3) == ((1, 1), True)
+    assert await vote(make_dal, True, level_id) == ((2, 0), True)  # switched back
+    assert (await count_rows(session_maker, LikeUsers), await count_rows(session_maker, DislikeUsers)) == (2, 0)
+    dal = make_dal(read_only=True)
+    try:
+        level = await dal.get_level_by_level_id(level_id)
+        assert level.score == 2
+        assert await dal.get_like_type(level, 2) == '0'
+    finally:
+        await dal.close()
+
+
+async def test_clears_are_recorded_once(add_levels, make_dal, session_maker):
+    [level_id] = await add_levels(1)
+    for _ in range(3):
+        dal = make_dal()
+        try:
+            level = await dal.add_clear_to_level(2, level_id, record=500)
+            await dal.commit()
+        finally:
+            await dal.close()
+    assert level.clears == 3
+    assert await count_rows(session_maker, ClearedUsers) == 1